@@ -0,0 +1,213 @@
+import argparse
+import contextlib
+import functools
+import glob
+import heapq
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import frontend
+import semantic_parser
+import syntax_parser
+from scanner import map_file
+from stats import Stats
+from tokens import format_token, read_tokens
+
+
+# Outcome of compiling one document of a batch
+class BatchResult:
+    __slots__ = ("name", "output", "messages", "error", "stats")
+
+    def __init__(self, name, output, messages, error=None, stats=None):
+        self.name = name
+        self.output = output  # text the stage writes, as frontend.compile_file would
+        self.messages = messages  # scanner and syntax errors the stages printed
+        self.error = error  # the exception that stopped the document, if any
+        self.stats = stats  # Stats.as_dict() of the document when stats were asked for
+
+    def to_json(self):
+        record = {"document": self.name, "output": self.output, "messages": self.messages, "error": self.error}
+        if self.stats is not None:
+            record["stats"] = self.stats
+        return json.dumps(record)
+
+
+# Documents of a batch as (name, path, text): every file of a directory, the files a glob pattern
+# matches, or the lines of a JSONL file. Text is None when the document is read from its path.
+def documents(source):
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                yield path, path, None
+    elif source.endswith(".jsonl") and os.path.isfile(source):
+        with open(source, "r") as file:
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    yield f"{source}:{number}", None, line
+    else:
+        for path in sorted(glob.glob(source, recursive=True)):
+            if os.path.isfile(path):
+                yield path, path, None
+
+
+# Compiling one document, run inside the worker processes.
+# With tokens=True the documents are in the text token format (like semantic_parser_tests/).
+# With a cache directory, results are reused across documents, workers and runs (see result_cache.py).
+# With stats=True the result carries the document's stats.Stats (documents in the token format are timed
+# as a whole).
+def compile_document(document, stage="semantic", compact=False, tokens=False, max_errors=None, cache=None,
+                     stats=False):
+    name, path, text = document
+    output = io.StringIO()
+    messages = io.StringIO()
+    error = None
+    stats = Stats() if stats else None
+    try:
+        with contextlib.redirect_stdout(messages):
+            if not tokens:
+                frontend.compile_source(text if text is not None else map_file(path), stage, output, compact,
+                                        max_errors, cache and frontend.make_cache(cache, shared=True), stats=stats)
+            elif stats is not None:
+                with stats.stage(stage):
+                    compile_tokens(path, stage, output, max_errors)
+            else:
+                compile_tokens(path, stage, output, max_errors)
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+    return BatchResult(name, output.getvalue(), messages.getvalue().splitlines(), error,
+                       stats and stats.as_dict())
+
+
+# Compiling a chunk of documents in a worker, one task for all of them
+def compile_chunk(chunk, **options):
+    return [compile_document(document, **options) for document in chunk]
+
+
+# Running a stage on a document in the text token format
+def compile_tokens(path, stage, output, max_errors=None):
+    if stage == "tokens":
+        output.writelines(format_token(token) + "\n" for token in read_tokens(path))
+    elif stage == "syntax":
+        syntax_parser.Parser(read_tokens(path)).parse().print_tree(file=output)
+    elif stage == "validate":
+        for diagnostic in semantic_parser.validate(read_tokens(path), max_errors=max_errors):
+            output.write(f"{diagnostic}\n")
+    else:
+        parser = semantic_parser.Parser(read_tokens(path), max_errors=max_errors)
+        parser.parse().print_output(output, parser.errors)
+
+
+# Compiling every document of a batch across worker processes.
+# Results are yielded in input order, each one as soon as it and all before it are done.
+# Documents are sent to the workers chunk_size at a time, and at most two chunks per worker are out at once,
+# so the source is read only a little ahead of the results (a large JSONL file is never held whole).
+def compile_batch(source, stage="semantic", workers=None, chunk_size=16, compact=False, tokens=False,
+                  max_errors=None, cache=None, stats=False):
+    options = dict(stage=stage, compact=compact, tokens=tokens, max_errors=max_errors, cache=cache, stats=stats)
+    if workers == 1:
+        yield from map(functools.partial(compile_document, **options), documents(source))
+        return
+    workers = workers or os.cpu_count() or 1
+    compile_some = functools.partial(compile_chunk, **options)
+    remaining = documents(source)
+    pending = deque()  # futures of the chunks sent, in input order
+    with ProcessPoolExecutor(workers) as executor:
+        try:
+            while True:
+                chunk = list(islice(remaining, chunk_size))
+                if not chunk:
+                    break
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(compile_some, chunk))
+            while pending:
+                yield from pending.popleft().result()
+        finally:  # when the results stop being read, the chunks not started yet are dropped
+            for future in pending:
+                future.cancel()
+
+
+# Stats of a whole batch and the documents that took longest, kept as the results go by
+class BatchStats:
+    def __init__(self, slowest=5):
+        self.total = Stats()
+        self.documents = 0
+        self.slowest = slowest
+        self.heap = []  # (seconds, order, name, stats) of the slowest documents so far, fastest first
+
+    def add(self, result):
+        if result.stats is None:
+            return
+        self.total.merge(result.stats)
+        self.documents += 1
+        entry = (result.stats["total_seconds"], self.documents, result.name, result.stats)
+        if len(self.heap) < self.slowest:
+            heapq.heappush(self.heap, entry)
+        elif self.slowest:
+            heapq.heappushpop(self.heap, entry)
+
+    def report(self, file):
+        file.write(f"{self.documents:,} documents\n")
+        self.total.report(file)
+        if self.heap:
+            file.write("slowest documents:\n")
+            for seconds, _, name, stats in sorted(self.heap, reverse=True):
+                stages = ", ".join(f"{stage} {spent:.4f}s" for stage, spent in stats["seconds"].items() if spent)
+                file.write(f"    {seconds:10.4f}s  {name}  ({stages})\n")
+
+
+# Writing one result in the text layout: a header line, then what the document printed and produced
+def write_text(result, output):
+    output.write(f"==> {result.name} <==\n")
+    for message in result.messages:
+        output.write(message + "\n")
+    output.write(result.output)
+    if result.error:
+        output.write(f"ERROR: {result.error}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile many JSON documents in parallel")
+    parser.add_argument("source", help="directory, glob pattern or JSONL file (one document per line)")
+    parser.add_argument("--stage", choices=["tokens", "syntax", "semantic", "validate"], default="semantic",
+                        help="last stage to run, its output is written (default: semantic)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="documents sent to a worker at a time (default: 16)")
+    parser.add_argument("--compact", action="store_true", help="keep trees in compact arrays to save memory")
+    parser.add_argument("--tokens", action="store_true", help="documents are in the text token format")
+    parser.add_argument("--max-errors", type=int, help="stop the semantic parser after this many errors")
+    parser.add_argument("--cache", metavar="DIRECTORY", help="keep results in this directory and reuse them")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="output layout (default: text)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--stats", action="store_true",
+                        help="write the time of each stage and counts for the whole batch to stderr")
+    parser.add_argument("--slowest", type=int, default=5, metavar="N",
+                        help="with --stats, also list the N slowest documents (default: 5)")
+    args = parser.parse_args(argv)
+    output = open(args.output, "w") if args.output else sys.stdout
+    batch_stats = BatchStats(args.slowest) if args.stats else None
+    try:
+        for result in compile_batch(args.source, args.stage, args.workers, args.chunk_size, args.compact, args.tokens,
+                                    args.max_errors, args.cache, args.stats):
+            if args.format == "jsonl":
+                output.write(result.to_json() + "\n")
+            else:
+                write_text(result, output)
+            output.flush()
+            if batch_stats is not None:
+                batch_stats.add(result)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if batch_stats is not None:
+        batch_stats.report(sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
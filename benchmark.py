@@ -0,0 +1,541 @@
+import argparse
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import binary_format
+import compact
+import corpus
+import frontend
+import incremental
+import lazy
+import parallel_scan
+import semantic_parser
+import structural
+import syntax_parser
+from scanner import Scanner, scan_buffer, scan_file
+from tokens import InternTable, Token, format_token, read_tokens
+
+
+# List element with every kind of token
+ITEM = '{"name": "Alice \\"A\\" Smith", "age": 30, "score": -12.5e3, "active": true, "tags": [null, false]}'
+
+
+# Building a document with every kind of token, roughly `size` characters long
+def make_document(size):
+    count = max(1, size // (len(ITEM) + 2))
+    return "[" + ", ".join([ITEM] * count) + "]"
+
+
+# Writing the same kind of document to a file in pieces, so it can be bigger than memory
+def write_document(path, size):
+    block = ", ".join([ITEM] * 10_000)
+    with open(path, "w") as file:
+        file.write("[" + ITEM)
+        written = len(ITEM) + 1
+        while written + len(block) + 3 < size:
+            file.write(", " + block)
+            written += len(block) + 2
+        # the rest of the size in single items, so small sizes are not left with one item
+        items = max(0, (size - written - 1) // (len(ITEM) + 2))
+        file.write((", " + ITEM) * items + "]")
+
+
+# Best time of a few runs
+def best_time(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+# Tokens per second of each scanner engine
+def bench_scanner(size=1_000_000):
+    document = make_document(size)
+    print(f"Scanner on {len(document)} characters")
+    for engine in ("dfa", "regex"):
+        elapsed, tokens = best_time(lambda: Scanner(document, engine).scan_all())
+        print(f"    {engine:<6} {len(tokens) / elapsed:>12,.0f} tokens/sec  ({elapsed:.3f}s)")
+
+
+# Semantic parser time per element for growing lists and dicts, flat time per element means linear
+def bench_semantic_scaling(sizes=(1_000, 10_000, 100_000, 1_000_000)):
+    if isinstance(sizes, int):  # one size, as semantic=SIZE on the command line
+        sizes = (sizes,)
+    print("Semantic parser scaling")
+    for size in sizes:
+        list_tokens = [Token("[")]
+        dict_tokens = [Token("{")]
+        for i in range(size):
+            if i:
+                list_tokens.append(Token(","))
+                dict_tokens.append(Token(","))
+            list_tokens.append(Token("NUM", str(i)))
+            dict_tokens += [Token("STR", f'"k{i}"'), Token(":"), Token("NUM", str(i))]
+        list_tokens.append(Token("]"))
+        dict_tokens.append(Token("}"))
+        for name, tokens in (("list", list_tokens), ("dict", dict_tokens)):
+            elapsed, _ = best_time(lambda: semantic_parser.Parser(tokens).parse(), repeat=1)
+            print(f"    {name} of {size:>9,}  {elapsed:8.3f}s  {elapsed / size * 1e6:6.2f} us/element")
+
+
+# Memory kept by a tree built from the tokens (the tokens themselves are not counted)
+def tree_memory(build, tokens):
+    tracemalloc.start()
+    tree = build(tokens)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, tree
+
+
+# Memory of the object trees against the compact array trees
+def bench_tree_memory(size=1_000_000):
+    document = make_document(size)
+    tokens = Scanner(document).scan_all()
+    print(f"Tree memory for {len(document)} characters ({len(tokens)} tokens)")
+    builds = [
+        ("syntax", lambda tokens: syntax_parser.Parser(tokens).parse()),
+        ("syntax compact", compact.parse_syntax),
+        ("semantic", lambda tokens: semantic_parser.Parser(tokens).parse()),
+        ("semantic compact", compact.parse_semantic),
+    ]
+    for name, build in builds:
+        used, _ = tree_memory(build, tokens)
+        print(f"    {name:<17} {used / 2**20:8.1f} MiB  {used / len(document):5.1f}x input")
+
+
+# Peak memory and time of a run
+def peak_memory(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed, result
+
+
+# Copied lexemes against span tokens, for scanning alone and for a compact parse tree that is never read
+def bench_spans(size=1_000_000):
+    document = make_document(size)
+    encoded = document.encode("utf-8")
+    print(f"Span tokens on {len(document)} characters")
+    runs = [
+        ("scan str, copies", lambda: Scanner(document).scan_all()),
+        ("scan str, spans", lambda: Scanner(document, spans=True).scan_all()),
+        ("scan bytes, copies", lambda: list(scan_buffer(encoded, False))),
+        ("scan bytes, spans", lambda: list(scan_buffer(encoded, True))),
+        ("compact tree, copies", lambda: compact.parse_syntax(Scanner(document).scan_regex())),
+        ("compact tree, spans", lambda: compact.parse_syntax(Scanner(document, spans=True).scan_regex())),
+    ]
+    for name, run in runs:
+        peak, elapsed, _ = peak_memory(run)
+        print(f"    {name:<21} {peak / 2**20:8.1f} MiB peak  {elapsed:.3f}s")
+
+
+# One file-input case of bench_mmap, run in its own process so its peak RSS is its own
+MMAP_CASES = {
+    "read, first 1000 tokens": lambda path: sum(1 for _ in itertools.islice(Scanner(open(path).read()).scan_regex(), 1000)),
+    "mmap, first 1000 tokens": lambda path: sum(1 for _ in itertools.islice(scan_file(path), 1000)),
+    "read, all tokens": lambda path: sum(1 for _ in Scanner(open(path).read()).scan_regex()),
+    "mmap, all tokens": lambda path: sum(1 for _ in scan_file(path)),
+}
+
+
+def run_mmap_case(name, path):
+    start = time.perf_counter()
+    count = MMAP_CASES[name](path)
+    elapsed = time.perf_counter() - start
+    print(count, elapsed, peak_rss())
+
+
+# Peak resident memory of this process in KiB. VmHWM starts afresh when a program is exec'd, while
+# ru_maxrss keeps the peak of the parent that forked it, so a small case would report the parent's.
+def peak_rss():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Reading a whole file against memory-mapping it, on a generated document of `size` bytes
+def bench_mmap(size=1 << 30):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "document.json")
+        write_document(path, size)
+        print(f"File input on {os.path.getsize(path):,} bytes")
+        for name in MMAP_CASES:
+            result = subprocess.run([sys.executable, __file__, "mmap-case", name, path],
+                                    capture_output=True, text=True, check=True)
+            count, elapsed, rss = result.stdout.split()
+            print(f"    {name:<24} {int(count):>12,} tokens  {float(elapsed):8.3f}s  {int(rss) / 1024:9.1f} MiB peak RSS")
+
+
+# The original route: tokens written out as text, read back, parsed into an AST and printed
+def text_token_route(document, directory):
+    path = os.path.join(directory, "tokens.txt")
+    with open(path, "w") as file:
+        file.writelines(format_token(token) + "\n" for token in Scanner(document).scan_all())
+    parser = semantic_parser.Parser(read_tokens(path))
+    parser.parse().print_output(io.StringIO(), parser.errors)
+    return parser.errors
+
+
+# Checking documents for semantic errors with and without building the tree
+def bench_validate(size=1_000_000):
+    document = make_document(size)
+    print(f"Semantic checks on {len(document)} characters")
+    with tempfile.TemporaryDirectory() as directory:
+        runs = [
+            ("scan -> text tokens -> AST", lambda: text_token_route(document, directory)),
+            ("scan -> AST", lambda: frontend.compile_source(document, "semantic", io.StringIO())),
+            ("validate", lambda: frontend.validate(document)),
+        ]
+        for name, run in runs:
+            elapsed, _ = best_time(run)
+            print(f"    {name:<27} {len(document) / elapsed / 2**20:8.2f} MiB/s  ({elapsed:.3f}s)")
+
+
+# Small edits to a document reparsed from scratch against incrementally
+def bench_incremental(size=1_000_000, edits=20):
+    document = incremental.Document(make_document(size))
+    print(f"Edits to a document of {len(document.text)} characters")
+    positions = [document.text.find('"age": ', len(document.text) * i // edits) + 7 for i in range(edits)]
+    elapsed, _ = best_time(lambda: semantic_parser.Parser(Scanner(document.text).scan_regex()).parse(), repeat=1)
+    print(f"    full reparse   {elapsed * 1e3:9.2f} ms/edit")
+    start = time.perf_counter()
+    for position in positions:
+        document.edit(position, position + 2, "31")
+    elapsed = (time.perf_counter() - start) / edits
+    print(f"    incremental    {elapsed * 1e3:9.2f} ms/edit")
+
+
+# Compiling the same documents over and over, with and without the result cache
+def bench_cache(size=100_000, documents=10, rounds=5):
+    payloads = [make_document(size + i) for i in range(documents)]
+    print(f"{documents} documents of {size} characters, compiled {rounds} times each")
+    cache = frontend.make_cache()
+    for name, options in (("no cache", {}), ("cache", {"cache": cache})):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for payload in payloads:
+                frontend.compile_source(payload, "semantic", io.StringIO(), **options)
+        print(f"    {name:<9} {time.perf_counter() - start:8.3f}s")
+    print(f"    {cache.stats()}")
+
+
+# Memory kept by the tokens and tree of a document whose keys and values repeat, with and without interning
+def bench_intern(size=1_000_000):
+    document = make_document(size)
+    print(f"Interning on {len(document)} characters")
+    builds = [
+        ("syntax", lambda document: syntax_parser.Parser(Scanner(document).scan_all()).parse()),
+        ("syntax interned", lambda document: syntax_parser.Parser(
+            Scanner(document, intern=InternTable()).scan_all(), intern=True).parse()),
+        ("semantic", lambda document: semantic_parser.Parser(Scanner(document).scan_all()).parse()),
+        ("semantic interned", lambda document: semantic_parser.Parser(
+            Scanner(document, intern=InternTable()).scan_all(), intern=True).parse()),
+    ]
+    for name, build in builds:
+        start = time.perf_counter()
+        used, _ = tree_memory(build, document)
+        elapsed = time.perf_counter() - start
+        print(f"    {name:<18} {used / 2**20:8.1f} MiB  {elapsed:.3f}s")
+
+
+# Writing tokens and trees out and loading them back, in the text forms against the binary forms.
+# Only the parse tree is written as text: the AST's text form indents each element of a list one step
+# deeper than the one before, so it grows with the square of the list length.
+def bench_binary(size=1_000_000):
+    document = make_document(size)
+    tokens = Scanner(document).scan_all()
+    syntax_tree = syntax_parser.Parser(tokens).parse()
+    semantic_tree = semantic_parser.Parser(tokens).parse()
+    print(f"Stored forms of {len(document)} characters ({len(tokens)} tokens)")
+    with tempfile.TemporaryDirectory() as directory:
+        def path(name):
+            return os.path.join(directory, name)
+
+        def write_text_tokens():
+            with open(path("tokens.txt"), "w") as file:
+                file.writelines(format_token(token) + "\n" for token in tokens)
+
+        def write_text_tree():
+            with open(path("syntax.txt"), "w") as file:
+                syntax_tree.print_tree(file=file)
+
+        def write_binary(name, dump):
+            with open(path(name), "wb") as file:
+                dump(file)
+
+        def read_binary(name, load):
+            with open(path(name), "rb") as file:
+                return load(file)
+
+        runs = [
+            ("tokens, write text", write_text_tokens, "tokens.txt"),
+            ("tokens, write binary", lambda: write_binary(
+                "tokens.bin", lambda file: binary_format.dump_tokens(tokens, file)), "tokens.bin"),
+            ("tokens, read text", lambda: read_tokens(path("tokens.txt")), None),
+            ("tokens, read binary", lambda: read_binary("tokens.bin", lambda file: list(
+                binary_format.TokenReader(file))), None),
+            ("parse tree, write text", write_text_tree, "syntax.txt"),
+            ("parse tree, write binary", lambda: write_binary(
+                "syntax.bin", lambda file: binary_format.dump_tree(syntax_tree, file, "syntax")), "syntax.bin"),
+            ("parse tree, rescan", lambda: syntax_parser.Parser(Scanner(document).scan_regex()).parse(), None),
+            ("parse tree, load binary", lambda: read_binary("syntax.bin", binary_format.load_tree), None),
+            ("AST, write binary", lambda: write_binary(
+                "semantic.bin", lambda file: binary_format.dump_tree(semantic_tree, file, "semantic")), "semantic.bin"),
+            ("AST, rescan", lambda: semantic_parser.Parser(Scanner(document).scan_regex()).parse(), None),
+            ("AST, load binary", lambda: read_binary("semantic.bin", binary_format.load_tree), None),
+        ]
+        for name, run, written in runs:
+            elapsed, _ = best_time(run)
+            stored = f"{os.path.getsize(path(written)) / 2**20:8.2f} MiB" if written else ""
+            print(f"    {name:<25} {elapsed:8.3f}s  {stored}")
+
+
+# Scanning a generated file of `size` bytes with more and more worker processes, into token arrays
+# (scan_blocks) and into tokens (scan_parallel)
+def bench_parallel(size=100 << 20):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "document.json")
+        write_document(path, size)
+        print(f"Parallel scanning on {os.path.getsize(path):,} bytes")
+        if (os.cpu_count() or 1) == 1:
+            print("    a single CPU: every run scans in one process")
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            blocks = lambda: sum(len(block) for block in parallel_scan.scan_blocks(path, workers, min_size=0))
+            tokens = lambda: sum(1 for _ in parallel_scan.scan_parallel(path, workers, min_size=0))
+            elapsed, count = best_time(blocks, repeat=1)
+            tokens_elapsed, _ = best_time(tokens, repeat=1)
+            print(f"    {workers:>3} workers  {count:>12,} tokens  {elapsed:8.3f}s arrays  {tokens_elapsed:8.3f}s tokens")
+
+
+# Writing the parse tree and the AST of a generated document to a file in each output form
+def bench_output(size=1_000_000):
+    document = corpus.generate(size)
+    trees = [("parse tree", frontend.parse_syntax(document)), ("AST", frontend.parse_semantic(document))]
+    print(f"Tree output for {len(document)} characters")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "output")
+        for name, tree in trees:
+            for form in ("text", "jsonl"):
+                def write():
+                    with open(path, "w") as file:
+                        if name == "AST":
+                            tree.print_output(file, form=form)
+                        else:
+                            tree.print_tree(file=file, form=form)
+                elapsed, _ = best_time(write)
+                written = os.path.getsize(path)
+                print(f"    {name:<11} {form:<6} {elapsed:8.3f}s  {written / 2**20:8.2f} MiB  "
+                      f"{written / elapsed / 2**20:8.2f} MiB/s")
+
+
+# Scanning bytes with and without the NumPy structural pre-pass, on records, on the same records indented
+# (mostly whitespace) and on records of long strings
+def bench_structural(size=2_000_000):
+    records = corpus.generate(size)
+    documents = {
+        "records": records,
+        "whitespace": json.dumps(json.loads(records), indent=8),
+        "strings": corpus.generate(size, string_length=200),
+    }
+    if structural.numpy is None:
+        print("Structural pre-pass: NumPy is not installed, scan_structural is scan_buffer")
+    for name, document in documents.items():
+        encoded = document.encode("utf-8")
+        print(f"Scanning {name}, {len(encoded)} bytes")
+        plain = None
+        for scan in (scan_buffer, structural.scan_structural):
+            for spans in (True, False):
+                elapsed, count = best_time(lambda: sum(1 for _ in scan(encoded, spans)))
+                plain = plain or elapsed
+                print(f"    {scan.__name__ + (', spans' if spans else ', copies'):<26} {count:>9,} tokens  "
+                      f"{elapsed:8.3f}s  {len(encoded) / elapsed / 2**20:8.2f} MiB/s  {plain / elapsed:6.2f}x")
+
+
+# A sensor dump (records holding long lists of readings) parsed into an AST with number lexemes, and with
+# numbers=True: valid numbers become ints and floats and the lists of them arrays
+def bench_numbers(size=2_000_000):
+    rng = random.Random(0)
+    records = []
+    length = 0
+    while length < size:
+        readings = ", ".join(f"{rng.uniform(-100, 100):.3f}" for _ in range(1000))
+        counts = ", ".join(str(rng.randrange(1 << 20)) for _ in range(1000))
+        records.append(f'{{"sensor": "s{len(records)}", "readings": [{readings}], "counts": [{counts}]}}')
+        length += len(records[-1])
+    document = "[" + ", ".join(records) + "]"
+    check_number_leaves()
+    print(f"Sensor dump of {len(document)} characters")
+    for name, numbers in (("lexemes", False), ("numbers", True)):
+        peak, elapsed, _ = peak_memory(lambda: frontend.parse_semantic(document, numbers=numbers))
+        print(f"    {name:<8} {peak / 2**20:8.1f} MiB peak  {elapsed:.3f}s")
+
+
+# Lists that go back to one node per number print each number as scanned, whatever numbers are next to it
+# (the 1 of [1, 2.5, "a"] is not the 1.0 of an array of floats)
+def check_number_leaves():
+    for text in ('[1, 2.5, "a"]', '[2.5, 1, "a"]', '[1, 2, "a"]', '[1, 2.5, 12345678901234567890123]'):
+        printed = []
+        for numbers in (False, True):
+            output = io.StringIO()
+            frontend.parse_semantic(text, numbers=numbers).print_output(output)
+            printed.append(output.getvalue())
+        if printed[0] != printed[1]:
+            raise AssertionError(f"numbers=True changes the leaves of {text}")
+
+
+# Point lookups in a generated file through the bracket index, against parsing the whole file
+def bench_lazy(size=10_000_000):
+    document = corpus.generate(size)
+    records = json.loads(document)
+    first, last = f"[0].{next(iter(records[0]))}", f"[{len(records) - 1}].{next(iter(records[-1]))}"
+    print(f"Lookups in {len(document)} characters, {len(records)} records")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "input.json")
+        with open(path, "w") as file:
+            file.write(document)
+        cases = {
+            "full parse": lambda: frontend.parse_syntax_file(path),
+            "bracket index": lambda: lazy.LazyDocument(frontend.map_file(path)),
+            f"query {first}": lambda: frontend.query_file(path, first),
+            f"query {last}": lambda: frontend.query_file(path, last),
+        }
+        full = None
+        for name, case in cases.items():
+            elapsed, _ = best_time(case, repeat=1 if name == "full parse" else 3)
+            full = full or elapsed
+            print(f"    {name:<30} {elapsed:8.3f}s  {full / elapsed:8.1f}x")
+
+
+# Shapes of the generated documents of the stages benchmark, arguments of corpus.Corpus
+SHAPES = {
+    "records": {},
+    "deep": {"depth": 200, "width": 1, "nesting": 1.0},
+    "wide": {"depth": 2, "width": 1000},
+    "long strings": {"string_length": 200},
+    "unique keys": {"key_repetition": 0.0},
+    "errors": {"error_density": 0.05},
+}
+
+
+# Printer output that is only counted, so the printers are timed without the cost of keeping their text
+class CountingWriter:
+    def __init__(self):
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+
+
+# Each stage of the frontend on its own: its input is made before it is timed
+def stage_runs(document):
+    tokens = Scanner(document).scan_all()
+    syntax_tree = syntax_parser.Parser(tokens).parse()
+    semantic_tree = semantic_parser.Parser(tokens).parse()
+    return [
+        ("scan", lambda: Scanner(document).scan_all()),
+        ("syntax", lambda: syntax_parser.Parser(tokens).parse()),
+        ("semantic", lambda: semantic_parser.Parser(tokens).parse()),
+        ("print syntax", lambda: syntax_tree.print_tree(file=CountingWriter())),
+        ("print semantic", lambda: semantic_tree.print_output(CountingWriter())),  # the tree, not the errors
+    ], len(tokens)
+
+
+# Throughput and peak memory of every stage on documents of each shape, at sizes growing 4x up to `size`.
+# The scaling exponent is how the time grows with the size: 1 for linear, 2 for quadratic.
+# Returns the measurements, which --json writes out and --compare checks against an earlier run.
+def bench_stages(size=300_000):
+    sizes = [size // 64, size // 16, size // 4, size]
+    results = []
+    print(f"Stages on generated documents of {sizes[0]:,} to {size:,} characters")
+    for shape, arguments in SHAPES.items():
+        times = {}
+        for target in sizes:
+            document = corpus.generate(target, **arguments)
+            runs, token_count = stage_runs(document)
+            for stage, run in runs:
+                elapsed, _ = best_time(run)
+                peak, _, _ = peak_memory(run)
+                times.setdefault(stage, []).append((len(document), elapsed, peak))
+                results.append({"shape": shape, "size": len(document), "tokens": token_count, "stage": stage,
+                                "seconds": elapsed, "chars_per_second": len(document) / elapsed,
+                                "peak_bytes": peak})
+        for stage, points in times.items():
+            (first_size, first_time, _), (last_size, last_time, last_peak) = points[0], points[-1]
+            if last_size == first_size or not first_time or not last_time:  # too small to grow with the size
+                scaling = "   -"
+            else:
+                scaling = f"{math.log(last_time / first_time) / math.log(last_size / first_size):4.2f}"
+            print(f"    {shape:<13} {stage:<15} {last_size / last_time / 2**20:8.2f} MiB/s  "
+                  f"{last_peak / 2**20:8.1f} MiB peak  scaling {scaling}")
+    return results
+
+
+# Measurements of this run against an earlier one, by shape, size and stage
+def compare_results(old, new, threshold=0.1):
+    before = {(result["shape"], result["size"], result["stage"]): result for result in old["results"]}
+    print(f"Against {old['python']} run of {old['time']}")
+    for result in new["results"]:
+        previous = before.get((result["shape"], result["size"], result["stage"]))
+        if previous is None:
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        verdict = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else ""
+        print(f"    {result['shape']:<13} {result['size']:>10,} {result['stage']:<15} {ratio:6.2f}x time  "
+              f"{result['peak_bytes'] / max(previous['peak_bytes'], 1):6.2f}x peak  {verdict}")
+
+
+BENCHMARKS = {"scanner": bench_scanner, "semantic": bench_semantic_scaling, "memory": bench_tree_memory,
+              "spans": bench_spans, "mmap": bench_mmap, "parallel": bench_parallel, "validate": bench_validate,
+              "incremental": bench_incremental, "cache": bench_cache, "intern": bench_intern,
+              "binary": bench_binary, "stages": bench_stages,
+              "output": bench_output, "lazy": bench_lazy,
+              "structural": bench_structural, "numbers": bench_numbers}
+# Left out of a plain run because they take long: run them by name
+SLOW = {"mmap", "parallel"}
+
+# python benchmark.py [name[=size] ...] [--json FILE] [--compare FILE]
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["mmap-case"]:
+        run_mmap_case(sys.argv[2], sys.argv[3])
+        sys.exit()
+    parser = argparse.ArgumentParser(description="Benchmarks of the frontend")
+    parser.add_argument("benchmarks", nargs="*", metavar="name[=size]",
+                        help=f"benchmarks to run (default: all but {', '.join(sorted(SLOW))})")
+    parser.add_argument("--json", metavar="FILE", help="write the measurements of the stages benchmark to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compare them with those of an earlier --json FILE")
+    args = parser.parse_args()
+    results = []
+    for argument in args.benchmarks or [name for name in BENCHMARKS if name not in SLOW]:
+        name, _, size = argument.partition("=")
+        measured = BENCHMARKS[name](int(float(size))) if size else BENCHMARKS[name]()
+        results.extend(measured or [])
+    run = {"python": platform.python_version(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(run, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            compare_results(json.load(file), run)
@@ -0,0 +1,330 @@
+import sys
+
+import compact as compact_trees
+import semantic_parser
+import syntax_parser
+from diagnostics import Diagnostic
+from tokens import TYPE_CODE, TYPES, Token, format_token
+
+# Binary forms of a token stream and of a tree, for keeping the output of a stage and loading it back
+# without scanning or parsing again. Numbers are varints (7 bits a byte, low bits first) and strings go
+# through a string table: the first time a string is written it follows inline and is given the next
+# index, later it is written as that index.
+#
+# Token file: TOKEN_MAGIC, then per token a tag byte (the type's code, | VALUE_FLAG when a string ref
+# follows) and its offset, then END_TAG. The offset is a varint: 0 for a token without one, else 1 + the
+# zigzag form (0, -1, 1, -2 ... as 0, 1, 2, 3 ...) of its distance from the last offset, a byte for most tokens.
+# Tree file: TREE_MAGIC, a byte for the stage (syntax or semantic), the number of errors and a (code,
+# message) string ref pair for each (the message as printed, ending with the error's position), then per node
+# in pre-order: type ref, value ref, number of children.
+# Values are strings only: writing tokens or trees with number values (numbers=True) raises ValueError.
+TOKEN_MAGIC = b"JTK\x02"
+TREE_MAGIC = b"JTR\x01"
+VALUE_FLAG = 0x80
+END_TAG = 0xff
+STAGES = ["syntax", "semantic"]
+
+# String refs: NO_STRING for None, INLINE for a string that follows and is not kept in the table,
+# NEW for one that follows and takes the next index, then STRING_BASE + index for a kept one
+NO_STRING, INLINE, NEW, STRING_BASE = 0, 1, 2, 3
+INLINE_REFS = (INLINE, NEW)
+# Bytes enough for a tag, an offset, a string ref and a string length, decoded without checking for the end of the chunk
+RECORD_HEAD = 32
+# Only short strings are put in the table (long ones rarely repeat), and only so many of them
+MAX_STRINGS = 1 << 16
+MAX_STRING_LENGTH = 64
+
+# Bytes gathered before they are written out
+FLUSH_SIZE = 1 << 16
+
+
+# Writing side: records are encoded into a buffer that is written to the file as it fills up
+class Encoder:
+    def __init__(self, file, magic):
+        self.file = file
+        self.buffer = bytearray(magic)
+        self.strings = {None: NO_STRING}  # string -> its ref
+
+    def varint(self, value):
+        buffer = self.buffer
+        while value >= 0x80:
+            buffer.append(value & 0x7f | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def string(self, text):
+        try:
+            ref = self.strings.get(text)
+        except TypeError:  # an array of numbers
+            ref = None
+        if ref is not None:
+            if ref < 0x80:
+                self.buffer.append(ref)
+            else:
+                self.varint(ref)
+            return
+        if type(text) is not str:  # an int, float or array value of numbers=True
+            raise ValueError("numbers=True tokens and trees have no binary form")
+        data = text.encode("utf-8")
+        if len(self.strings) <= MAX_STRINGS and len(text) <= MAX_STRING_LENGTH:
+            self.strings[text] = STRING_BASE + len(self.strings) - 1
+            self.buffer.append(NEW)
+        else:
+            self.buffer.append(INLINE)
+        self.varint(len(data))
+        self.buffer += data
+
+    def flush(self, force=False):
+        if force or len(self.buffer) >= FLUSH_SIZE:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+
+
+# Reading side: the file is read in chunks, records are decoded from the chunk in hand
+class Decoder:
+    def __init__(self, file, magic, chunk_size=FLUSH_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.data = b""
+        self.pos = 0
+        self.strings = [None] * STRING_BASE  # by ref, from STRING_BASE on (and None at NO_STRING)
+        self.need(len(magic))
+        if self.data[:len(magic)] != magic:
+            raise ValueError("not a binary file of this kind, or of another version")
+        self.pos = len(magic)
+
+    # Having at least `count` bytes after pos in hand, fewer only at the end of the file
+    def need(self, count):
+        if len(self.data) - self.pos >= count:
+            return
+        pieces = [self.data[self.pos:]]
+        have = len(pieces[0])
+        while have < count:
+            piece = self.file.read(max(count - have, self.chunk_size))
+            if not piece:
+                break
+            pieces.append(piece)
+            have += len(piece)
+        self.data = b"".join(pieces)
+        self.pos = 0
+
+    def byte(self):
+        self.need(1)
+        try:
+            value = self.data[self.pos]
+        except IndexError:
+            raise ValueError("binary file ends in the middle of a record") from None
+        self.pos += 1
+        return value
+
+    def varint(self):
+        self.need(10)
+        data = self.data
+        pos = self.pos
+        value = 0
+        shift = 0
+        try:
+            while True:
+                byte = data[pos]
+                pos += 1
+                value |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+        except IndexError:
+            raise ValueError("binary file ends in the middle of a record") from None
+        self.pos = pos
+        return value
+
+    def string(self):
+        ref = self.varint()
+        if ref not in INLINE_REFS:
+            return self.strings[ref]
+        length = self.varint()
+        self.need(length)
+        if len(self.data) - self.pos < length:
+            raise ValueError("binary file ends in the middle of a record")
+        text = self.data[self.pos:self.pos + length].decode("utf-8")
+        self.pos += length
+        if ref == NEW:
+            self.strings.append(text)
+        return text
+
+
+# Writing tokens to a binary file (opened "wb") as they come. close() ends the stream; the file is left open.
+class TokenWriter:
+    def __init__(self, file):
+        self.encoder = Encoder(file, TOKEN_MAGIC)
+        self.last = 0  # offset of the last token that had one
+
+    def write(self, token):
+        encoder = self.encoder
+        value = token.value
+        encoder.buffer.append(TYPE_CODE[token.type] if value is None else TYPE_CODE[token.type] | VALUE_FLAG)
+        start = getattr(token, "start", None)
+        if start is None:
+            encoder.buffer.append(0)
+        else:
+            distance = start - self.last
+            self.last = start
+            encoder.varint(1 + (distance * 2 if distance >= 0 else -distance * 2 - 1))
+        if value is not None:
+            encoder.string(value)
+        encoder.flush()
+
+    def write_all(self, tokens):
+        for token in tokens:
+            self.write(token)
+
+    def close(self):
+        self.encoder.buffer.append(END_TAG)
+        self.encoder.flush(force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+
+
+# Tokens of a binary token file (opened "rb"), read as they are iterated.
+# Tokens with the same value share one string, as the scanner's interned values do.
+class TokenReader:
+    def __init__(self, file):
+        self.decoder = Decoder(file, TOKEN_MAGIC)
+
+    # Decodes from the chunk in hand as long as a whole record head is there, the decoder's methods take
+    # over for long varints and new strings
+    def __iter__(self):
+        decoder = self.decoder
+        strings = decoder.strings
+        data = decoder.data
+        pos = decoder.pos
+        last = 0
+        try:
+            while True:
+                if len(data) - pos < RECORD_HEAD:
+                    decoder.pos = pos
+                    decoder.need(RECORD_HEAD)
+                    data = decoder.data
+                    pos = decoder.pos
+                tag = data[pos]
+                if tag == END_TAG:
+                    decoder.pos = pos + 1
+                    return
+                offset = data[pos + 1]
+                if offset < 0x80:
+                    pos += 2
+                else:
+                    decoder.pos = pos + 1
+                    offset = decoder.varint()
+                    data = decoder.data
+                    pos = decoder.pos
+                if offset:
+                    offset -= 1
+                    last = start = last + (offset >> 1 if not offset & 1 else -(offset + 1 >> 1))
+                else:
+                    start = None
+                if not tag & VALUE_FLAG:
+                    yield Token(TYPES[tag], None, start)
+                    continue
+                ref = data[pos]
+                if ref < 0x80 and ref not in INLINE_REFS:
+                    pos += 1
+                    value = strings[ref]
+                else:
+                    decoder.pos = pos
+                    value = decoder.string()
+                    data = decoder.data
+                    pos = decoder.pos
+                yield Token(TYPES[tag & ~VALUE_FLAG], value, start)
+        except IndexError:
+            raise ValueError("binary file ends in the middle of a record") from None
+
+
+def dump_tokens(tokens, file):
+    with TokenWriter(file) as writer:
+        writer.write_all(tokens)
+
+
+# Writing a parse tree ("syntax") or an AST ("semantic"), along with the errors of its parse, to a binary
+# file. Works on the parsers' nodes and on compact tree views alike.
+def dump_tree(root, file, stage, errors=()):
+    encoder = Encoder(file, TREE_MAGIC)
+    encoder.buffer.append(STAGES.index(stage))
+    encoder.varint(len(errors))
+    for error in errors:
+        encoder.string(error.code)
+        encoder.string(str(error))
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        children = node.children
+        encoder.string(node.type)
+        encoder.string(node.value)
+        encoder.varint(len(children))
+        stack.extend(reversed(children))
+        if len(encoder.buffer) >= FLUSH_SIZE:
+            encoder.flush()
+    encoder.flush(force=True)
+
+
+# Tree of a binary tree file and the errors stored with it (as Diagnostics without their tokens).
+# The nodes are the parsers' own, or a compact tree with compact=True.
+def load_tree(file, compact=False):
+    decoder = Decoder(file, TREE_MAGIC)
+    stage = STAGES[decoder.byte()]
+    errors = []
+    for _ in range(decoder.varint()):
+        code = decoder.string()
+        errors.append(Diagnostic(code, decoder.string()))
+    if stage == "syntax":
+        node_class, view_class = syntax_parser.Node, compact_trees.SyntaxView
+    else:
+        node_class, view_class = semantic_parser.Node, compact_trees.SemanticView
+    tree = compact_trees.build_tree(tree_records(decoder), node_class, compact and view_class)
+    return tree, errors
+
+
+# (type, value, number of children) of each node in pre-order, up to the end of the tree.
+# Records of one byte per field are decoded in place, as TokenReader does.
+def tree_records(decoder):
+    strings = decoder.strings
+    missing = 1  # nodes still to come
+    try:
+        while missing:
+            if len(decoder.data) - decoder.pos < RECORD_HEAD:
+                decoder.need(RECORD_HEAD)
+            data = decoder.data
+            pos = decoder.pos
+            type_ref, value_ref, count = data[pos], data[pos + 1], data[pos + 2]
+            if (type_ref | value_ref | count) < 0x80 and type_ref not in INLINE_REFS and \
+                    value_ref not in INLINE_REFS:
+                decoder.pos = pos + 3
+                type_, value = strings[type_ref], strings[value_ref]
+            else:
+                type_ = decoder.string()
+                value = decoder.string()
+                count = decoder.varint()
+            missing += count - 1
+            yield type_, value, count
+    except IndexError:
+        raise ValueError("binary file ends in the middle of a record") from None
+
+
+# Text form of a binary file, the same as the stage that made it prints:
+# python binary_format.py FILE
+if __name__ == "__main__":
+    with open(sys.argv[1], "rb") as file:
+        magic = file.read(len(TOKEN_MAGIC))
+        file.seek(0)
+        if magic == TOKEN_MAGIC:
+            for token in TokenReader(file):
+                print(format_token(token))
+        else:
+            tree, errors = load_tree(file)
+            if isinstance(tree, syntax_parser.Node):
+                tree.print_tree()
+            else:
+                tree.print_output(sys.stdout, errors)
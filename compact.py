@@ -0,0 +1,165 @@
+from array import array
+
+import semantic_parser
+import syntax_parser
+from tokens import SpanToken
+
+# Node types of both trees, stored as small ints ("numbers" holds the array of a list of numbers)
+KINDS = ["", ",", ":", "[", "]", "{", "}", "value", "list", "dict", "pair", "STRING", "NUMBER", "BOOLEAN", "NULL",
+         "numbers"]
+KIND_OF = {type_: kind for kind, type_ in enumerate(KINDS)}
+# AST leaves are named by their value ("name", 30, true), their name is kept in the value slot
+LEAF = len(KINDS)
+NO_NODE = -1
+
+
+# Tree kept in parallel arrays instead of one Python object per node.
+# Pass it to a parser as tree=CompactTree() and the parser's nodes become indexes into it.
+# Values of span tokens are kept as offsets into the source and only sliced out when read.
+class CompactTree:
+    def __init__(self):
+        self.kinds = array("B")
+        self.parents = array("i")
+        self.first_child = array("i")
+        self.last_child = array("i")  # lets add_child append without walking the siblings
+        self.next_sibling = array("i")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.values = {}  # values that are not spans of the source, by node index
+        self.source = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, value=None, start=-1, end=-1):
+        index = len(self.kinds)
+        self.kinds.append(kind)
+        self.parents.append(NO_NODE)
+        self.first_child.append(NO_NODE)
+        self.last_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.starts.append(start)
+        self.ends.append(end)
+        if value is not None:
+            self.values[index] = value
+        return index
+
+    # Creating a node and returning its index
+    def node(self, type_, value=None):
+        kind = KIND_OF.get(type_, LEAF)
+        return self.add(kind, type_ if kind == LEAF else value)
+
+    # Creating a node for a token's value, a type of None makes an AST leaf named by the value
+    def leaf(self, type_, token):
+        kind = LEAF if type_ is None else KIND_OF[type_]
+        if type(token) is SpanToken and (self.source is None or token.source is self.source):
+            self.source = token.source
+            return self.add(kind, None, token.start, token.end)
+        return self.add(kind, token.value)
+
+    def add_child(self, parent, child):
+        self.parents[child] = parent
+        last = self.last_child[parent]
+        if last == NO_NODE:
+            self.first_child[parent] = child
+        else:
+            self.next_sibling[last] = child
+        self.last_child[parent] = child
+
+    # The value kept for a node, materialized from the source for spans
+    def stored_value(self, index):
+        start = self.starts[index]
+        if start < 0:
+            return self.values.get(index)
+        value = self.source[start:self.ends[index]]
+        return value if isinstance(value, str) else value.decode("utf-8")
+
+    def type_of(self, index):
+        kind = self.kinds[index]
+        return self.stored_value(index) if kind == LEAF else KINDS[kind]
+
+    def value_of(self, index):
+        return None if self.kinds[index] == LEAF else self.stored_value(index)
+
+    def children_of(self, index):
+        child = self.first_child[index]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    # Node-like view of a node, for code written against the object trees
+    def view(self, index, view_class=None):
+        return (view_class or NodeView)(self, index)
+
+
+# Read-only stand-in for a Node, made only when a node is looked at
+class NodeView:
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def type(self):
+        return self.tree.type_of(self.index)
+
+    @property
+    def value(self):
+        return self.tree.value_of(self.index)
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.index]
+        return None if parent == NO_NODE else type(self)(self.tree, parent)
+
+    @property
+    def children(self):
+        return [type(self)(self.tree, child) for child in self.tree.children_of(self.index)]
+
+
+# Views that print like the parsers' own nodes
+class SyntaxView(NodeView):
+    __slots__ = ()
+    print_tree = syntax_parser.Node.print_tree
+
+
+class SemanticView(NodeView):
+    __slots__ = ()
+    print_output = semantic_parser.Node.print_output
+
+
+# Parse tree of the tokens as a compact tree, returned as a view of its root
+def parse_syntax(tokens, **options):
+    tree = CompactTree()
+    root = syntax_parser.Parser(tokens, tree=tree, **options).parse()
+    return tree.view(root, SyntaxView)
+
+
+# Abstract syntax tree of the tokens as a compact tree, returned as a view of its root
+def parse_semantic(tokens, **options):
+    tree = CompactTree()
+    root = semantic_parser.Parser(tokens, tree=tree, **options).parse()
+    return tree.view(root, SemanticView)
+
+
+# Rebuilding a tree from its (type, value, number of children) records in pre-order (any iterable of them)
+# as the parsers' Nodes, or as a compact tree seen through view_class
+def build_tree(records, node_class, view_class=None):
+    if view_class:
+        tree = CompactTree()
+        make, link = tree.node, tree.add_child
+    else:
+        make, link = node_class, node_class.add_child
+    records = iter(records)
+    type_, value, count = next(records)
+    root = make(type_, value)
+    stack = [[root, count]]  # nodes with the number of children they still miss
+    for type_, value, count in records:
+        while stack[-1][1] == 0:
+            stack.pop()
+        stack[-1][1] -= 1
+        node = make(type_, value)
+        link(stack[-1][0], node)
+        stack.append([node, count])
+    return tree.view(root, view_class) if view_class else root
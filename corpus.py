@@ -0,0 +1,148 @@
+import argparse
+import random
+import string
+import sys
+
+# Keys drawn from the shared pool when keys repeat
+KEY_POOL = 64
+RESERVED = ("true", "false")
+SCALARS = ["STR", "NUM", "BOOL", "NULL"]
+
+
+# Generator of JSON documents of a chosen shape, the same document for the same arguments and seed.
+# A document is a list of records (dicts) and is as long as `size` characters or a little longer.
+#   depth           deepest nesting of lists and dicts, the outer list included
+#   width           elements in each list and dict
+#   nesting         chance that a value is a list or dict, where depth allows it
+#   string_length   average length of strings and keys
+#   key_repetition  chance that a key comes from a small pool shared by all dicts rather than being new
+#   error_density   chance that a value, key or list element carries a semantic error (TYPE 1 to 7)
+class Corpus:
+    def __init__(self, depth=4, width=8, nesting=0.3, string_length=12, key_repetition=0.9, error_density=0.0,
+                 seed=0):
+        self.depth = max(depth, 2)
+        self.width = max(width, 1)
+        self.nesting = nesting
+        self.string_length = max(string_length, 1)
+        self.key_repetition = key_repetition
+        self.error_density = error_density
+        self.random = random.Random(seed)
+        self.keys = [self.word() for _ in range(KEY_POOL)]
+        self.fresh = 0  # new keys made so far, numbered so they never clash
+
+    def document(self, size):
+        out = ["["]
+        length = 1
+        while length < size:
+            first = len(out)
+            if first > 1:
+                out.append(", ")
+            self.write(out, "{", 2)
+            length += sum(map(len, out[first:]))
+        out.append("]")
+        return "".join(out)
+
+    # Writing a value of a kind (a scalar type, "[" or "{") at a nesting level, without recursion.
+    # Each open list or dict is [bracket, elements left, level, keys used, element kind].
+    def write(self, out, kind, level):
+        stack = []
+        while True:
+            if kind == "[" or kind == "{":
+                out.append(kind)
+                stack.append([kind, self.width, level, set(), None])
+            else:
+                out.append(self.scalar(kind))
+            while stack:
+                frame = stack[-1]
+                if frame[1] == 0:
+                    out.append("]" if frame[0] == "[" else "}")
+                    stack.pop()
+                    continue
+                if frame[1] < self.width:
+                    out.append(", ")
+                frame[1] -= 1
+                level = frame[2] + 1
+                if frame[0] == "{":
+                    out.append(self.key(frame[3]) + ": ")
+                    kind = self.kind(level)
+                elif frame[4] is None:
+                    kind = frame[4] = self.kind(level)
+                elif self.error():  # TYPE 6, an element of another type
+                    kind = "NUM" if frame[4] == "STR" else "STR"
+                else:
+                    kind = frame[4]
+                break
+            else:
+                return
+
+    # Kind of a value at a level: a list or dict now and then while there is depth left, else a scalar
+    def kind(self, level):
+        if level <= self.depth and self.random.random() < self.nesting:
+            return self.random.choice("[{")
+        return self.random.choice(SCALARS)
+
+    def error(self):
+        return self.random.random() < self.error_density
+
+    def scalar(self, kind):
+        rng = self.random
+        if kind == "STR":
+            return '"true"' if self.error() else f'"{self.word()}"'  # TYPE 7
+        if kind == "NUM":
+            if self.error():
+                return rng.choice(["+1", "012", ".5", "5."])  # TYPE 3 and TYPE 1
+            return str(rng.randrange(100000)) if rng.random() < 0.5 else f"{rng.random() * 1000:.2f}"
+        if kind == "BOOL":
+            return rng.choice(RESERVED)
+        return "null"
+
+    def key(self, used):
+        rng = self.random
+        if self.error():
+            if used and rng.random() < 0.5:
+                return f'"{rng.choice(sorted(used))}"'  # TYPE 5
+            return rng.choice(['""', '"true"'])  # TYPE 2 and TYPE 4
+        key = rng.choice(self.keys) if rng.random() < self.key_repetition else None
+        if key is None or key in used:
+            self.fresh += 1
+            key = f"{self.word()}{self.fresh}"
+        used.add(key)
+        return f'"{key}"'
+
+    # Lowercase letters around string_length long, never a reserved word
+    def word(self):
+        length = self.random.randint(max(1, self.string_length // 2), self.string_length + self.string_length // 2)
+        while True:
+            word = "".join(self.random.choices(string.ascii_lowercase, k=length))
+            if word not in RESERVED:
+                return word
+
+
+def generate(size=1_000_000, seed=0, **shape):
+    return Corpus(seed=seed, **shape).document(size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a JSON document of a chosen shape for benchmarks")
+    parser.add_argument("size", type=lambda text: int(float(text)), help="characters, about")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--nesting", type=float, default=0.3)
+    parser.add_argument("--string-length", type=int, default=12)
+    parser.add_argument("--key-repetition", type=float, default=0.9)
+    parser.add_argument("--error-density", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+    document = generate(args.size, args.seed, depth=args.depth, width=args.width, nesting=args.nesting,
+                        string_length=args.string_length, key_repetition=args.key_repetition,
+                        error_density=args.error_density)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(document)
+    else:
+        sys.stdout.write(document)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+from tokens import LineIndex, line_column
+
+
+# Raised when a parse reaches its error limit, the parser stops there
+class TooManyErrors(Exception):
+    pass
+
+
+# One error found in a document: its type code ("TYPE 5", "DEPTH"), the message printed for it,
+# the token it was found at and that token's index in the token stream. Printed, the message ends with
+# the line and column of the token given the document's line index (a tokens.LineIndex), else its offset.
+class Diagnostic:
+    __slots__ = ("code", "message", "token", "position", "lines")
+
+    def __init__(self, code, message, token=None, position=None, lines=None):
+        self.code = code
+        self.message = message
+        self.token = token
+        self.position = position
+        self.lines = lines
+
+    def __str__(self):
+        offset = self.offset
+        if offset is None:
+            return self.message
+        if self.lines is not None:
+            return self.message + self.lines.where(offset)
+        return f"{self.message} (offset {offset})"
+
+    def __repr__(self):
+        return f"<Diagnostic {self.code} at token {self.position}: {self.message}>"
+
+    # Offset of the token in its source, None when the token does not keep one
+    @property
+    def offset(self):
+        return getattr(self.token, "start", None)
+
+    # Line and column of the token (both from 1), None when its offset is not known
+    @property
+    def line(self):
+        return self.line_column()[0]
+
+    @property
+    def column(self):
+        return self.line_column()[1]
+
+    def line_column(self):
+        offset = self.offset
+        if offset is None:
+            return None, None
+        if self.lines is not None:
+            return self.lines.line_column(offset)
+        if hasattr(self.token, "source"):
+            return line_column(self.token.source, offset)
+        return None, None
+
+
+# Errors of one parse, in the order they were found.
+# With max_errors the parse is stopped as soon as that many errors have been found.
+# lines is the line index of the document the errors are in; an error at a span token into another source
+# (or with none given) makes one for the token's source, as edited documents mix tokens of old and new text.
+class Diagnostics(list):
+    def __init__(self, max_errors=None, lines=None):
+        super().__init__()
+        self.max_errors = max_errors
+        self.lines = lines
+
+    def add(self, code, message, token=None, position=None):
+        if hasattr(token, "source") and (self.lines is None or self.lines.source is not token.source):
+            self.lines = LineIndex(token.source)
+        self.append(Diagnostic(code, message, token, position, self.lines))
+        if self.max_errors is not None and len(self) >= self.max_errors:
+            raise TooManyErrors(message)
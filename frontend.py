@@ -0,0 +1,247 @@
+import argparse
+import mmap
+import sys
+
+import binary_format
+import compact as compact_trees
+import lazy
+import result_cache
+import semantic_parser
+import structural as structural_scan
+import syntax_parser
+from diagnostics import Diagnostics
+from parallel_scan import scan_parallel
+from scanner import Scanner, map_file, scan_buffer, scan_stream
+from stats import Stats, no_stage
+from tokens import InternTable, line_index
+from tree_output import write_errors, write_tokens
+
+# Version of what the stages produce, part of the result cache keys: change it when tokens, trees or errors change
+VERSION = "3"
+
+
+# Tokens of a document given as a str, bytes, mmap, file object or iterable of chunks, produced lazily.
+# With spans, tokens of a str or buffer keep offsets into it instead of copies of their lexemes;
+# otherwise the copies can be shared through intern (a tokens.InternTable).
+# With a stats.Stats the tokens are counted and the time spent making them is recorded.
+# structural=True scans bytes and mmaps with the NumPy pre-pass of structural.py, when NumPy is installed.
+# With numbers=True, NUM tokens of valid numbers in str and buffer sources carry an int or float
+# (see scanner.number_value). The lines of a file object or chunks go into `lines` (a tokens.LineIndex()) as they
+# are read, when it is given.
+def scan(source, spans=False, intern=None, stats=None, structural=False, numbers=False, lines=None):
+    if isinstance(source, str):
+        tokens = Scanner(source, spans=spans, intern=intern, numbers=numbers).scan_regex()
+    elif isinstance(source, (bytes, bytearray, mmap.mmap)):
+        scan_bytes = structural_scan.scan_structural if structural else scan_buffer
+        tokens = scan_bytes(source, spans, intern=intern, numbers=numbers)
+    else:
+        tokens = scan_stream(source, intern=intern, lines=lines)
+    return tokens if stats is None else stats.scanned(tokens)
+
+
+# Parse tree of a document, the parser pulls tokens straight from the scanner.
+# With compact=True the tree is kept in arrays (see compact.py) and a view of its root is returned,
+# values stay in the source until they are read. With intern=True repeated values and leaves are stored once.
+def parse_syntax(source, compact=False, intern=False, stats=None):
+    lines = line_index(source)
+    if compact:
+        return compact_trees.parse_syntax(scan(source, spans=True, stats=stats, lines=lines), lines=lines)
+    tokens = scan(source, intern=InternTable() if intern else None, stats=stats, lines=lines)
+    return syntax_parser.Parser(tokens, intern=intern, lines=lines).parse()
+
+
+# Abstract syntax tree of a document. Semantic errors are collected in `errors` (a diagnostics.Diagnostics),
+# pass max_errors to stop parsing after that many. With intern=True leaves with the same value are stored once.
+# With numbers=True leaves of numbers hold ints and floats, and lists of numbers are arrays of them (such
+# trees have no binary form, binary_format raises ValueError for them).
+def parse_semantic(source, compact=False, errors=None, max_errors=None, intern=False, stats=None, numbers=False):
+    errors = Diagnostics(max_errors) if errors is None else errors
+    if errors.lines is None:
+        errors.lines = line_index(source)
+    if compact:
+        tokens = scan(source, spans=True, stats=stats, numbers=numbers, lines=errors.lines)
+        return compact_trees.parse_semantic(tokens, errors=errors, numbers=numbers)
+    if intern:  # the scanner hands out shared copies of repeated lexemes, spans would each slice their own
+        tokens = scan(source, intern=InternTable(), stats=stats, numbers=numbers, lines=errors.lines)
+    else:
+        tokens = scan(source, spans=True, stats=stats, numbers=numbers, lines=errors.lines)
+    return semantic_parser.Parser(tokens, errors=errors, intern=intern, numbers=numbers).parse()
+
+
+# Semantic errors of a document without building its tree (see semantic_parser.validate)
+def validate(source, errors=None, max_errors=None, stats=None):
+    errors = Diagnostics(max_errors) if errors is None else errors
+    if errors.lines is None:
+        errors.lines = line_index(source)
+    return semantic_parser.validate(scan(source, spans=True, stats=stats, lines=errors.lines), errors=errors)
+
+
+# The same stages over a file path. The file is memory-mapped, so only the pages
+# the scanner touches are read in, and compact trees point straight into the mapping.
+# Big files can be scanned by several worker processes (workers=None uses one per CPU).
+def scan_file(path, spans=True, workers=1):
+    if workers != 1:
+        return scan_parallel(path, workers, spans)
+    return scan(map_file(path), spans)
+
+
+def parse_syntax_file(path, compact=False):
+    return parse_syntax(map_file(path), compact)
+
+
+def parse_semantic_file(path, compact=False, errors=None, max_errors=None):
+    return parse_semantic(map_file(path), compact, errors, max_errors)
+
+
+def validate_file(path, errors=None, max_errors=None):
+    return validate(map_file(path), errors, max_errors)
+
+
+# Parse tree "value" node at a path such as "people[3].name" (see lazy.py), None if there is nothing there.
+# Only the brackets of the file are indexed and only the levels on the way to the value are scanned.
+def query_file(path, query):
+    return lazy.LazyDocument(map_file(path)).find(query)
+
+
+# Writing the parse tree of the value at a path, in any of the output formats
+def write_query(path, query, output=None, format="text"):
+    node = query_file(path, query)
+    if node is None:
+        return False
+    if format == "binary":
+        binary_format.dump_tree(node, output or sys.stdout.buffer, "syntax")
+    else:
+        node.print_tree(file=output or sys.stdout, form=format)
+    return True
+
+
+# The stages a result_cache.ResultCache runs for the inputs it has not seen
+CACHED_STAGES = {"scan": scan, "syntax": parse_syntax, "semantic": parse_semantic, "validate": validate}
+
+
+# Result cache of these stages (see result_cache.ResultCache for the limits). With shared=True there is one
+# per directory in each process, for worker processes that are only handed the directory.
+def make_cache(directory=None, shared=False, **limits):
+    if shared:
+        return result_cache.shared_cache(directory, CACHED_STAGES, VERSION)
+    return result_cache.ResultCache(CACHED_STAGES, VERSION, directory=directory, **limits)
+
+
+# Running one stage of the frontend over a file and writing its output, - reads stdin as a stream
+def compile_file(path, stage="semantic", output=None, compact=False, max_errors=None, cache=None, intern=False,
+                 format="text", stats=None):
+    compile_source(map_file(path) if path != "-" else sys.stdin.buffer, stage, output, compact, max_errors, cache,
+                   intern, format, stats)
+
+
+# Running one stage of the frontend over any source scan() accepts and writing its output.
+# With a result_cache.ResultCache, inputs it has seen before are not scanned or parsed again.
+# format="binary" writes tokens and trees in the forms of binary_format to a binary output instead of as text,
+# format="jsonl" writes JSON lines (see tree_output.py).
+# With a stats.Stats, each stage (writing the output included) is timed and what went through it counted.
+def compile_source(source, stage="semantic", output=None, compact=False, max_errors=None, cache=None,
+                   intern=False, format="text", stats=None):
+    binary = format == "binary" and stage != "validate"
+    output = output or (sys.stdout.buffer if binary else sys.stdout)
+    cached = cache is not None and cache.accepts(source)
+    measure = no_stage if stats is None else stats.stage
+    if stats is not None:
+        stats.input(source)
+    if stage == "tokens":
+        tokens = cache.scan(source) if cached else scan(source, spans=True)
+        if stats is not None:
+            tokens = stats.scanned(tokens)
+        with measure("output"):
+            if binary:
+                binary_format.dump_tokens(tokens, output)
+            else:
+                write_tokens(tokens, output, format)
+    elif stage == "syntax":
+        with measure("syntax"):
+            tree = cache.parse_syntax(source, compact) if cached else parse_syntax(source, compact, intern, stats)
+        if stats is not None:
+            stats.tree(tree)
+        with measure("output"):
+            if binary:
+                binary_format.dump_tree(tree, output, "syntax")
+            else:
+                tree.print_tree(file=output, form=format)
+    elif stage == "validate":  # only the errors, nothing for a valid document
+        with measure("validate"):
+            if cached:
+                errors = cache.validate(source, max_errors=max_errors)
+            else:
+                errors = validate(source, max_errors=max_errors, stats=stats)
+        if stats is not None:
+            stats.errors += len(errors)
+        with measure("output"):
+            write_errors(errors, output, format)
+    else:
+        errors = Diagnostics(max_errors)
+        with measure("semantic"):
+            if cached:
+                tree = cache.parse_semantic(source, compact, errors, max_errors)
+            else:
+                tree = parse_semantic(source, compact, errors, intern=intern, stats=stats)
+        if stats is not None:
+            stats.tree(tree)
+            stats.errors += len(errors)
+        with measure("output"):
+            if binary:
+                binary_format.dump_tree(tree, output, "semantic", errors)
+            else:
+                tree.print_output(output, errors, form=format)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON frontend compiler: scanner, syntax parser and semantic parser")
+    parser.add_argument("input", help="JSON file to compile, - for stdin")
+    parser.add_argument("--stage", choices=["tokens", "syntax", "semantic", "validate"], default="semantic",
+                        help="last stage to run, its output is written (default: semantic); "
+                             "validate writes only the semantic errors")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--compact", action="store_true", help="keep the tree in compact arrays to save memory")
+    parser.add_argument("--max-errors", type=int, help="stop the semantic parser after this many errors")
+    parser.add_argument("--cache", metavar="DIRECTORY", help="keep results in this directory and reuse them")
+    parser.add_argument("--intern", action="store_true", help="store repeated keys and values once in the tree")
+    parser.add_argument("--format", choices=["text", "jsonl", "binary"], default="text",
+                        help="output format (default: text); jsonl writes JSON lines, binary writes tokens and "
+                             "trees that binary_format.py reads back")
+    parser.add_argument("--stats", action="store_true",
+                        help="write the time of each stage and counts of tokens, nodes and errors to stderr")
+    parser.add_argument("--query", metavar="PATH",
+                        help="write only the parse tree of the value at PATH, such as people[3].name, parsing "
+                             "no more of the file than it takes to find it")
+    args = parser.parse_args(argv)
+    if args.query is not None:
+        if args.input == "-":
+            parser.error("--query needs a file, not stdin")
+        try:
+            if args.output:
+                with open(args.output, "wb" if args.format == "binary" else "w") as output:
+                    found = write_query(args.input, args.query, output, args.format)
+            else:
+                found = write_query(args.input, args.query, format=args.format)
+        except ValueError as error:  # brackets that do not balance
+            parser.exit(1, f"{args.input}: {error}\n")
+        if not found:
+            parser.exit(1, f"nothing at {args.query}\n")
+        return
+    if args.format == "binary" and args.stage == "validate":
+        parser.error("the validate stage only writes text")
+    cache = make_cache(args.cache) if args.cache else None
+    stats = Stats() if args.stats else None
+    if args.output:
+        with open(args.output, "wb" if args.format == "binary" else "w") as output:
+            compile_file(args.input, args.stage, output, args.compact, args.max_errors, cache, args.intern,
+                         args.format, stats)
+    else:
+        compile_file(args.input, args.stage, compact=args.compact, max_errors=args.max_errors, cache=cache,
+                     intern=args.intern, format=args.format, stats=stats)
+    if stats is not None:
+        sys.stdout.flush()
+        stats.report(sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+import semantic_parser
+from diagnostics import Diagnostics
+from iterative import DEFAULT_MAX_DEPTH, run
+from scanner import Scanner
+from tokens import LineIndex
+
+# How far past the start of its next step a scanner step may look (the DFA checks "false" from its first letter)
+LOOKAHEAD = 8
+# Values in a block of a ShiftedArray
+BLOCK_SIZE = 2048
+# Token types a value can start with
+VALUE_TYPES = frozenset(["STR", "NUM", "BOOL", "NULL", "[", "{"])
+
+
+# Sorted ints kept in blocks, each block with an amount still to be added to all of its values.
+# Adding to the values from an index on changes the values of one block and the amounts of the blocks
+# after it, so it costs a block and a pass over the blocks instead of a pass over the values.
+class ShiftedArray:
+    __slots__ = ("blocks", "pending", "firsts", "length")
+
+    def __init__(self, values=()):
+        values = array("q", values)
+        self.blocks = [values[index:index + BLOCK_SIZE] for index in range(0, len(values), BLOCK_SIZE)] or [values]
+        self.pending = [0] * len(self.blocks)
+        self.count()
+
+    # Index of the first value of each block
+    def count(self):
+        self.firsts = list(accumulate(map(len, self.blocks), initial=0))
+        self.length = self.firsts.pop()
+
+    def __len__(self):
+        return self.length
+
+    # Block of the value at index (the last block for the end) and the value's index in it
+    def locate(self, index):
+        block = bisect_right(self.firsts, index) - 1
+        return block, index - self.firsts[block]
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError("ShiftedArray index out of range")
+        block, index = self.locate(index)
+        return self.blocks[block][index] + self.pending[block]
+
+    # Index of the first value that is not below value
+    def bisect_left(self, value):
+        blocks = self.blocks
+        pending = self.pending
+        low, high = 0, len(blocks)
+        while low < high:  # blocks that start below value come first
+            middle = (low + high) // 2
+            if blocks[middle] and blocks[middle][0] + pending[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return 0
+        return self.firsts[low - 1] + bisect_left(blocks[low - 1], value - pending[low - 1])
+
+    # Adding amount to the values from index on
+    def add(self, index, amount):
+        if not amount or index >= self.length:
+            return
+        block, index = self.locate(index)
+        pending = self.pending
+        if index:
+            values = self.blocks[block]
+            values[index:] = array("q", [value + amount for value in values[index:]])
+            block += 1
+        pending[block:] = [later + amount for later in pending[block:]]
+
+    # Replacing the values [first, last) with values
+    def replace(self, first, last, values):
+        blocks = self.blocks
+        start = self.locate(first)[0]
+        stop = self.locate(last)[0] + 1
+        merged = array("q")
+        for block in range(start, stop):
+            merged.extend(self.shifted(block))
+        offset = self.firsts[start]
+        merged[first - offset:last - offset] = array("q", values)
+        if len(merged) < BLOCK_SIZE // 2 and stop < len(blocks):  # a short block takes in the next one
+            merged.extend(self.shifted(stop))
+            stop += 1
+        new = [merged[index:index + BLOCK_SIZE] for index in range(0, len(merged), BLOCK_SIZE)]
+        if not new and stop - start == len(blocks):
+            new = [merged]
+        blocks[start:stop] = new
+        self.pending[start:stop] = [0] * len(new)
+        self.count()
+
+    def shifted(self, block):
+        amount = self.pending[block]
+        return self.blocks[block] if not amount else array("q", [value + amount for value in self.blocks[block]])
+
+
+# Where a list or dict was parsed: its first token and first error (indexes as the parser saw them), the
+# number of tokens and errors in it, the nesting depth around it, its node, the lists and dicts directly
+# in it, and whether it parsed cleanly (every token in it of a kind the parser expected there).
+# A Document keeps where each child starts as offsets from where its container starts (child_firsts and
+# child_errors), so an edit moves only the lists and dicts after it on each level around it.
+class Container:
+    __slots__ = ("first", "size", "errors_first", "error_count", "depth", "node", "children", "mismatches",
+                 "clean", "child_firsts", "child_errors")
+
+    def __init__(self, first, errors_first, depth, mismatches=0):
+        self.first = first
+        self.size = 0
+        self.errors_first = errors_first
+        self.error_count = 0
+        self.depth = depth
+        self.node = None
+        self.children = []
+        self.mismatches = mismatches  # the parser's mismatches before it
+        self.clean = True
+        self.child_firsts = None
+        self.child_errors = None
+
+
+# Offsets of a container without lists or dicts in it, shared (adding to an empty array changes nothing)
+NO_CHILDREN = ShiftedArray()
+
+
+# Semantic parser that remembers where each list and dict starts and ends, and what it holds.
+# It can start in the middle of a token list: offset is the index of its first token, depth the nesting there.
+# Tokens of a kind it does not expect where it finds them (a missing ":", a "]" where a value goes) are mismatches.
+class TrackingParser(semantic_parser.Parser):
+    def __init__(self, tokens, offset=0, depth=0, **options):
+        super().__init__(tokens, **options)
+        self.position += offset
+        self.depth = depth
+        self.containers = []  # the outermost ones, in order
+        self.open = []  # the ones being parsed, innermost last
+        self.mismatches = 0
+
+    def parse_list(self):
+        self.open.append(Container(self.position, len(self.errors), self.depth, self.mismatches))
+        return self.finish((yield from super().parse_list()))
+
+    def parse_dict(self):
+        self.open.append(Container(self.position, len(self.errors), self.depth, self.mismatches))
+        return self.finish((yield from super().parse_dict()))
+
+    def finish(self, node):
+        container = self.open.pop()
+        container.size = self.position - container.first
+        container.error_count = len(self.errors) - container.errors_first
+        container.clean = self.mismatches == container.mismatches
+        container.node = node
+        (self.open[-1].children if self.open else self.containers).append(container)
+        return node
+
+    def eat(self, token_type):
+        token = self.current_token
+        if token is not None and token.type == token_type:
+            self.advance()
+        else:
+            self.mismatches += 1
+
+    def value(self):
+        token = self.current_token
+        if token is None or token.type not in VALUE_TYPES:
+            self.mismatches += 1
+        return (yield from super().value())
+
+    def parse_pair(self):
+        if self.current_token.type != "STR":
+            self.mismatches += 1
+        return (yield from super().parse_pair())
+
+
+# Giving a container the parser found, and all in it, the offsets of their children
+def settle(container):
+    stack = [container]
+    while stack:
+        container = stack.pop()
+        children = container.children
+        if not children:
+            container.child_firsts = container.child_errors = NO_CHILDREN
+            continue
+        container.child_firsts = ShiftedArray([child.first - container.first for child in children])
+        container.child_errors = ShiftedArray([child.errors_first - container.errors_first for child in children])
+        stack.extend(children)
+
+
+# Scanning text from a position until stop(pos) is true at a step or the text ends.
+# Returns the position of each step and the tokens made before it, the last step is where scanning ended.
+def scan_steps(text, pos=0, stop=None):
+    positions = []
+    counts = []
+    tokens = []
+    stopped = False
+
+    def trace(pos):
+        nonlocal stopped
+        positions.append(pos)
+        counts.append(len(tokens))
+        stopped = stop is not None and stop(pos)
+        return stopped
+
+    scanner = Scanner(text)
+    scanner.seek(pos)
+    tokens.extend(scanner.scan_regex(trace=trace))
+    if not stopped:
+        positions.append(len(text))
+        counts.append(len(tokens))
+    return positions, counts, tokens
+
+
+# A document that is kept scanned and parsed across edits.
+# An edit rescans the text around it until the scanner is back in step with the old tokens, then
+# reparses only the innermost list or dict holding the tokens that changed and splices it into the tree,
+# along with its errors (duplicate keys, mixed list types and the other checks).
+# The step positions, token counts and token offsets are ShiftedArrays, and lists and dicts keep their
+# children's offsets from their own start, so an edit costs about the size of the edit and of the list or
+# dict reparsed, not of the document. A list or dict is only reparsed alone when the one holding it parsed
+# cleanly: a parser that is off the structure looks ahead into it, so otherwise a larger one is reparsed.
+# starts[i] is where token i is in the current text. Errors are brought up to date when they are read: the
+# shifts of their positions wait until then, and their tokens get their offsets now, so errors give the line
+# and column they are at in the current text.
+class Document:
+    def __init__(self, text, max_depth=DEFAULT_MAX_DEPTH):
+        self.text = text
+        self.max_depth = max_depth
+        positions, counts, self.tokens = scan_steps(text)
+        self.positions = ShiftedArray(positions)
+        self.counts = ShiftedArray(counts)
+        self.starts = ShiftedArray([token.start for token in self.tokens])
+        self.parse()
+        self.stale = False
+
+    def parse(self):
+        parser = TrackingParser(self.tokens, max_depth=self.max_depth, errors=Diagnostics(lines=LineIndex(self.text)))
+        self.tree = parser.parse()
+        self.diagnostics = parser.errors  # in the order found, their positions before the shifts
+        self.shifts = []  # (end, shift): errors from end on move by shift, in the order of the edits
+        self.born = {}  # id of an error found by a reparse -> the shifts made before it
+        self.root = Container(0, 0, 0)  # the document, around the outermost lists and dicts
+        self.root.children = parser.containers
+        settle(self.root)
+
+    def print_output(self, file):
+        self.tree.print_output(file, self.errors)
+
+    # Replacing text[start:end] with replacement
+    def edit(self, start, end, replacement):
+        positions = self.positions
+        counts = self.counts
+        delta = len(replacement) - (end - start)
+        self.text = "".join((self.text[:start], replacement, self.text[end:]))
+
+        # Rescanning from the first step that may have looked at the edited text, until a step after
+        # the edit lands where a step of the old text did: from there on the tokens are the same
+        restart = max(positions.bisect_left(start - LOOKAHEAD) - 1, 0)
+        edit_end = start + len(replacement)
+
+        def back_in_step(pos):
+            if pos < edit_end:
+                return False
+            step = positions.bisect_left(pos - delta)
+            return step < len(positions) and positions[step] == pos - delta
+
+        new_positions, new_counts, new_tokens = scan_steps(self.text, positions[restart], back_in_step)
+        resync = positions.bisect_left(new_positions[-1] - delta)
+        first = counts[restart]
+        last = counts[resync]
+        shift = len(new_tokens) - (last - first)
+        positions.replace(restart, resync, new_positions[:-1])
+        positions.add(restart + len(new_positions) - 1, delta)
+        counts.replace(restart, resync, [first + count for count in new_counts[:-1]])
+        counts.add(restart + len(new_counts) - 1, shift)
+        self.starts.replace(first, last, [token.start for token in new_tokens])
+        self.starts.add(first + len(new_tokens), delta)
+
+        # Only the tokens that differ from the old ones count as changed
+        old_tokens = self.tokens[first:last]
+        same = 0
+        while same < min(len(old_tokens), len(new_tokens)) and same_token(old_tokens[same], new_tokens[same]):
+            same += 1
+        first += same
+        old_tokens = old_tokens[same:]
+        new_tokens = new_tokens[same:]
+        same = 0
+        while same < min(len(old_tokens), len(new_tokens)) and \
+                same_token(old_tokens[-1 - same], new_tokens[-1 - same]):
+            same += 1
+        last -= same
+        new_tokens = new_tokens[:len(new_tokens) - same]
+        self.tokens[first:last] = new_tokens
+        if first != last or new_tokens:
+            self.reparse(first, last, shift)
+        self.stale = True
+
+    # Reparsing the innermost list or dict that holds the changed tokens [first, last) (old indexes).
+    # Its bracket and first element are left out, the parser around it looks at those; and the new
+    # list or dict must end where the old one did, or else a larger one is tried.
+    def reparse(self, first, last, shift):
+        # The lists and dicts around the changed tokens, outermost first: the one holding each, its index
+        # there, and where its tokens and errors start now
+        path = []
+        holder, begin, errors_begin = self.root, 0, 0
+        while True:
+            index = holder.child_firsts.bisect_left(first - 1 - begin) - 1  # the last one starting by first - 2
+            if index < 0:
+                break
+            container = holder.children[index]
+            container_first = begin + holder.child_firsts[index]
+            if not first < container_first + container.size or last > container_first + container.size:
+                break
+            errors_begin += holder.child_errors[index]
+            path.append((holder, index, container_first, errors_begin))
+            holder, begin = container, container_first
+        for level in range(len(path) - 1, -1, -1):
+            holder, index, container_first, _ = path[level]
+            if holder is not self.root and not holder.clean:
+                continue
+            container = holder.children[index]
+            begin = max(container_first - 1, 0)  # the token before a list or dict decides its node type
+            # tokens from begin on, without stepping over the ones before it
+            tokens = map(self.tokens.__getitem__, range(begin, len(self.tokens)))
+            parser = TrackingParser(tokens, begin, container.depth, max_depth=self.max_depth)
+            if begin < container_first:
+                parser.advance()
+            if parser.current_token.type == "[":
+                node = run(parser.parse_list())
+            else:
+                node = run(parser.parse_dict())
+            if parser.position == container_first + container.size + shift:
+                self.splice(path[:level + 1], node, parser, shift)
+                return
+        self.parse()
+
+    def splice(self, path, node, parser, shift):
+        holder, index, first, errors_first = path[-1]
+        old = holder.children[index]
+        new = parser.containers[-1]
+        errors_shift = len(parser.errors) - old.error_count
+        end = first + old.size
+        errors_end = errors_first + old.error_count
+        # Errors before the old list or dict were found before it, at tokens before it
+        self.shifts.append((end, shift))
+        for diagnostic in parser.errors:
+            self.born[id(diagnostic)] = len(self.shifts)
+        self.diagnostics[errors_first:errors_end] = parser.errors
+
+        settle(new)
+        # The tree refers to the old node, it takes over the new one's contents
+        old.node.type, old.node.value, old.node.children = node.type, node.value, node.children
+        new.node = old.node
+        holder.children[index] = new
+        for holder, index, _, _ in path:
+            holder.child_firsts.add(index + 1, shift)
+            holder.child_errors.add(index + 1, errors_shift)
+            holder.size += shift
+            holder.error_count += errors_shift
+            holder.clean = holder.clean and new.clean
+
+    @property
+    def errors(self):
+        if self.stale:
+            self.locate_errors()
+        return self.diagnostics
+
+    # Moving errors to the positions of their tokens now, and giving them the line and column there
+    def locate_errors(self):
+        lines = LineIndex(self.text)
+        self.diagnostics.lines = lines
+        tokens = self.tokens
+        shifts = self.shifts
+        born = self.born
+        for diagnostic in self.diagnostics:
+            position = diagnostic.position
+            for end, shift in shifts[born.get(id(diagnostic), 0):]:
+                if position >= end:
+                    position += shift
+            diagnostic.position = position
+            diagnostic.lines = lines
+            if position < len(tokens) and tokens[position] is diagnostic.token:
+                diagnostic.token.start = self.starts[position]
+        shifts.clear()
+        born.clear()
+        self.stale = False
+
+
+def same_token(a, b):
+    return a.type == b.type and a.value == b.value
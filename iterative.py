@@ -0,0 +1,31 @@
+# Helpers that keep parsing and tree walking off the Python call stack
+
+# Deepest nesting of lists and dicts a parser accepts unless told otherwise
+DEFAULT_MAX_DEPTH = 100000
+
+
+# Running a parsing routine written as a generator.
+# A routine yields the sub-routine it needs and gets that sub-routine's result back,
+# so nesting grows this explicit stack instead of the interpreter's.
+def run(routine):
+    stack = [routine]
+    result = None
+    while stack:
+        try:
+            call = stack[-1].send(result)
+        except StopIteration as done:
+            stack.pop()
+            result = done.value
+        else:
+            stack.append(call)
+            result = None
+    return result
+
+
+# Nodes of a tree in pre-order with their depth, without recursion
+def walk(root):
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield node, depth
+        stack.extend((child, depth + 1) for child in reversed(node.children))
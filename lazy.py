@@ -0,0 +1,194 @@
+import re
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+import syntax_parser
+from scanner import Scanner, scan_buffer
+from tokens import Token
+
+# Everything up to the next bracket outside a string, with the bracket as group 1: strings are passed over
+# with the same alternatives as the scanner's STR group, so a quote outside a string always starts one
+BRACKET = re.compile(r'(?:[^"\[\]{}]++|"(?:[^"\\]++|\\"?)*+"?)*+([\[\]{}])')
+BYTES_BRACKET = re.compile(rb'(?:[^"\[\]{}]++|"(?:[^"\\]++|\\"?)*+"?)*+([\[\]{}])')
+
+
+# Offsets of the brackets of a document and of the bracket each one is paired with, found in one
+# regex pass over the source without making tokens
+class BracketIndex:
+    def __init__(self, source):
+        self.positions = array("q")
+        self.partners = array("q")  # index of the matching bracket
+        pattern = BRACKET if isinstance(source, str) else BYTES_BRACKET
+        opens = []
+        for match in pattern.finditer(source):
+            index = len(self.positions)
+            self.positions.append(match.start(1))
+            self.partners.append(-1)
+            if match.group(1) in ("[", "{", b"[", b"{"):
+                opens.append(index)
+            elif opens:  # like skip_nested, any closing bracket ends the innermost list or dict
+                partner = opens.pop()
+                self.partners[index] = partner
+                self.partners[partner] = index
+            else:
+                raise ValueError(f"closing bracket at {match.start(1)} without an opening one")
+        if opens:
+            raise ValueError(f"bracket at {self.positions[opens[-1]]} is never closed")
+
+    # Offset of the first bracket at or after pos, and of the one paired with it
+    def bracket_at(self, pos):
+        index = bisect_left(self.positions, pos)
+        return self.positions[index], self.positions[self.partners[index]]
+
+
+# Stand-in for a dict or list node of the parse tree: its children are parsed the first time they are
+# looked at, and the lists and dicts among them are lazy nodes in turn
+class LazyNode:
+    __slots__ = ("type", "value", "document", "start", "end", "parsed")
+
+    def __init__(self, document, type_, start, end):
+        self.type = type_
+        self.value = None
+        self.document = document
+        self.start = start  # offsets of its brackets
+        self.end = end
+        self.parsed = None
+
+    @property
+    def children(self):
+        if self.parsed is None:
+            self.parsed = self.document.parse_container(self.start, self.end).children
+        return self.parsed
+
+    print_tree = syntax_parser.Node.print_tree
+
+
+# Syntax parser over the tokens of one level, where each nested list or dict is a single LAZY token
+# whose value is (bracket, start, end)
+class LevelParser(syntax_parser.Parser):
+    def __init__(self, tokens, document):
+        super().__init__(tokens)
+        self.document = document
+
+    def value(self):
+        token = self.current_token
+        if token is None or token.type != "LAZY":
+            return (yield from super().value())
+        node = self.node("value")
+        self.advance()
+        bracket, start, end = token.value
+        self.add_child(node, LazyNode(self.document, "dict" if bracket == "{" else "list", start, end))
+        return node
+
+
+# A document (str, bytes or mmap) that is indexed rather than parsed: only the lists and dicts that are
+# looked at are parsed, one level at a time, and a path lookup scans only the levels on its way.
+# The tree is the syntax parser's, for documents whose brackets balance.
+class LazyDocument:
+    def __init__(self, source):
+        self.source = source
+        self.index = BracketIndex(source)
+        self.root = None
+
+    def tree(self):
+        if self.root is None:
+            self.root = LevelParser(self.level_tokens(0), self).parse()
+        return self.root
+
+    # (token, position of the scanner step that made it) from pos on
+    def steps(self, pos):
+        step = pos
+
+        def trace(pos):
+            nonlocal step
+            step = pos
+
+        if isinstance(self.source, str):
+            scanner = Scanner(self.source, spans=True)
+            scanner.seek(pos)
+            tokens = scanner.scan_regex(trace=trace)
+        else:
+            tokens = scan_buffer(self.source, True, pos, trace)
+        for token in tokens:
+            yield token, step
+
+    # Tokens from pos up to the bracket at offset stop (to the end with None), each list or dict on the
+    # way as one LAZY token
+    def level_tokens(self, pos, stop=None):
+        while True:
+            for token, step in self.steps(pos):
+                if token.type == "[" or token.type == "{":
+                    start, end = self.index.bracket_at(step)
+                    yield Token("LAZY", (token.type, start, end))
+                    pos = end + 1
+                    break
+                yield token
+                if (token.type == "]" or token.type == "}") and self.index.bracket_at(step)[0] == stop:
+                    return
+            else:
+                return
+
+    # The parse tree node of the list or dict between the brackets at start and end
+    def parse_container(self, start, end):
+        bracket = self.source[start:start + 1]
+        bracket = bracket if isinstance(bracket, str) else bracket.decode()
+        parser = LevelParser(chain([Token(bracket)], self.level_tokens(start + 1, end)), self)
+        return syntax_parser.run(parser.parse_dict() if bracket == "{" else parser.parse_list())
+
+    # The "value" node at a path, None if there is nothing there. A path is a list of keys and list
+    # indexes, or a string such as "people[3].name" or "people.3.name".
+    def find(self, path):
+        segments = split_path(path) if isinstance(path, str) else path
+        token = next(self.level_tokens(0), None)
+        for segment in segments:
+            if token is None or token.type != "LAZY":
+                return None
+            bracket, start, end = token.value
+            tokens = self.level_tokens(start + 1, end)
+            token = find_key(tokens, segment) if bracket == "{" else find_element(tokens, segment)
+        if token is None:
+            return None
+        return LevelParser([token], self).parse()
+
+
+# The value token of a key among the tokens of a dict's level
+def find_key(tokens, key):
+    quoted = f'"{key}"'
+    expecting = "key"
+    found = False
+    for token in tokens:
+        if token.type == "," and expecting == "comma":
+            expecting = "key"
+        elif expecting == "key":
+            found = token.type == "STR" and token.value == quoted
+            expecting = "colon"
+        elif expecting == "colon" and token.type == ":":
+            expecting = "value"
+        elif expecting == "value":
+            if found:
+                return token
+            expecting = "comma"
+    return None
+
+
+# The token of the element at an index among the tokens of a list's level
+def find_element(tokens, index):
+    try:
+        index = int(index)
+    except ValueError:
+        return None
+    commas = 0
+    for token in tokens:
+        if token.type == ",":
+            commas += 1
+        elif commas == index and token.type != "]" and token.type != "}":
+            return token
+        elif commas > index:
+            break
+    return None
+
+
+# "people[3].name" -> ["people", "3", "name"]
+def split_path(path):
+    return [segment for segment in re.split(r"[.\[\]]+", path) if segment]
@@ -0,0 +1,279 @@
+import contextlib
+import io
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+from scanner import BYTES_LEXEME, map_file, scan_buffer
+from tokens import TYPE_CODE, TYPES, SpanToken, Token, format_token
+
+# Files smaller than this are scanned in-process, starting workers would cost more than it saves
+MIN_PARALLEL_SIZE = 50 << 20
+
+# Rest of a string when scanning starts inside it, the same alternatives as the scanner's STR group
+STRING_REST = re.compile(rb'(?:[^"\\]+|\\"?)*(")?')
+
+# Codes of the token types the workers send back (see tokens.TYPES)
+STR_CODE, NUM_CODE, BOOL_CODE, NULL_CODE = range(4)
+PUNCT_CODE = {ord(type_): TYPE_CODE[type_] for type_ in "[]{}:,"}
+
+
+# Result of scanning part of a buffer from an assumed starting position, kept in arrays so it is cheap to send.
+# The scanner only carries its position from one step to the next, so two scans that stand at the same
+# step position produce the same tokens from there on. A step ends where its token ends, so the ends of
+# the tokens are the step positions; the few steps that make no token are kept apart.
+class Speculation:
+    __slots__ = ("start", "stop", "kinds", "starts", "ends", "values", "steps", "messages", "error")
+
+    def __init__(self, start):
+        self.start = start
+        self.stop = start  # position of the step the scan stopped at
+        self.kinds = array("B")  # codes into TYPES
+        self.starts = array("q")
+        self.ends = array("q")
+        self.values = {}  # values of the tokens that do not hold their lexeme, by token index
+        self.steps = []  # (position, tokens before it) of the steps after a step that made no token
+        self.messages = []  # (tokens before it, position of the step, text): errors printed while scanning
+        self.error = None  # exception raised by the last step, the scan ends there
+
+    # Number of tokens made before the step at a position, -1 if the scan never stood there
+    def find(self, pos):
+        if pos == self.start:
+            return 0
+        index = bisect_left(self.ends, pos)
+        if index < len(self.ends) and self.ends[index] == pos:
+            return index + 1
+        for step, count in self.steps:
+            if step == pos:
+                return count
+        return -1
+
+    # Blocks of the tokens from the step at pos (index tokens in) to the end of the scan, with the errors
+    # printed in between written to output
+    def blocks(self, pos, index, buffer, output):
+        for count, step, text in self.messages:
+            if step >= pos:
+                if count > index:
+                    yield self.block(index, count, buffer)
+                    index = count
+                output.write(text)
+        if index < len(self.kinds):
+            yield self.block(index, len(self.kinds), buffer)
+        if self.error is not None:
+            raise self.error
+
+    def block(self, first, last, buffer):
+        values = {index - first: value for index, value in self.values.items() if first <= index < last}
+        return TokenBlock(buffer, self.kinds[first:last], self.starts[first:last], self.ends[first:last], values)
+
+
+# Tokens of a buffer as arrays of their types (codes into TYPES) and their start and end offsets, with
+# the values of those that do not hold their lexeme by index. Consumers that only need offsets and types
+# read the arrays; tokens() makes the tokens scan_buffer would.
+class TokenBlock:
+    __slots__ = ("buffer", "kinds", "starts", "ends", "values")
+
+    def __init__(self, buffer, kinds, starts, ends, values):
+        self.buffer = buffer
+        self.kinds = kinds
+        self.starts = starts
+        self.ends = ends
+        self.values = values
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def tokens(self, spans=True):
+        buffer = self.buffer
+        values = self.values
+        for index, kind, start, end in zip(range(len(self.kinds)), self.kinds, self.starts, self.ends):
+            if index in values:
+                yield Token(TYPES[kind], values[index], start)
+            elif kind <= NUM_CODE:
+                if spans:
+                    yield SpanToken(TYPES[kind], buffer, start, end)
+                else:
+                    yield Token(TYPES[kind], buffer[start:end].decode("utf-8"), start)
+            elif kind == BOOL_CODE:
+                yield Token("BOOL", "true" if end - start == 4 else "false", start)
+            else:
+                yield Token(TYPES[kind], None, start)
+
+
+# Scanning a buffer from `start` until a step reaches `limit` or a token ends where one of `known` (another
+# Speculation) does. The lexemes scan_buffer takes in one regex match go straight into the arrays, without
+# making tokens; scan_buffer takes the other steps (errors, non-ASCII characters, a string never closed)
+# one at a time, and the errors they print are kept as data.
+def speculate(buffer, start, limit, known=None):
+    run = Speculation(start)
+    kinds, starts, ends = run.kinds, run.starts, run.ends
+    known_ends = known.ends if known is not None else ()
+    size = len(buffer)
+    pos = start
+    while pos < limit and pos < size:
+        met = False
+        for match in BYTES_LEXEME.finditer(buffer, pos):
+            kind = match.lastgroup
+            end = match.end()
+            if kind == "PUNCT":
+                kinds.append(PUNCT_CODE[buffer[end - 1]])
+                starts.append(end - 1)
+            elif kind == "END":
+                if end == size and not match.group(kind):
+                    break
+                kinds.append(STR_CODE)
+                starts.append(match.start("STR"))
+            elif kind == "NUM":
+                if end < size and buffer[end] >= 0x80:
+                    break
+                kinds.append(NUM_CODE)
+                starts.append(match.start(kind))
+            elif kind == "BOOL":
+                kinds.append(BOOL_CODE)
+                starts.append(match.start(kind))
+            elif kind == "NULL":
+                kinds.append(NULL_CODE)
+                starts.append(end - 4)
+            else:
+                break
+            ends.append(end)
+            pos = end
+            if known_ends:
+                index = bisect_left(known_ends, pos)
+                met = index < len(known_ends) and known_ends[index] == pos
+            if pos >= limit or met:
+                break
+        if pos >= limit or pos >= size or met:
+            break
+        try:
+            pos = scan_step(buffer, pos, run)
+        except Exception as error:
+            # A wrong guess can fail where the real scan never goes, so the error is only raised if the step is used
+            run.error = error
+            break
+    run.stop = pos
+    return run
+
+
+# One step of scan_buffer at pos into a Speculation, returns where the next step begins
+def scan_step(buffer, pos, run):
+    after = len(buffer)
+
+    def trace(step_pos):
+        nonlocal after
+        if step_pos == pos:
+            return False
+        after = step_pos
+        return True
+
+    count = len(run.kinds)
+    printed = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(printed):
+            tokens = list(scan_buffer(buffer, True, pos, trace))
+    finally:
+        if printed.tell():  # always printed before the step's token
+            run.messages.append((count, pos, printed.getvalue()))
+    for token in tokens:
+        if type(token) is not SpanToken and token.type in ("STR", "NUM"):
+            run.values[len(run.kinds)] = token.value
+        run.kinds.append(TYPE_CODE[token.type])
+        run.starts.append(token.start)
+        run.ends.append(after)
+    if not tokens:
+        run.steps.append((after, count))
+    return after
+
+
+# Worker side: scanning the byte range [start, limit) of a file under both assumptions about where it begins.
+# Outside a string the range is scanned as is; inside one, scanning starts after the string's
+# closing quote and stops as soon as it meets a step of the first scan.
+def scan_range(path, start, limit):
+    buffer = map_file(path)
+    outside = speculate(buffer, start, limit)
+    inside = None
+    if start:
+        rest = STRING_REST.match(buffer, start)
+        if rest.group(1):
+            inside = speculate(buffer, rest.end(), limit, outside)
+    return outside, inside
+
+
+# Offsets splitting a buffer into `count` ranges of about the same size. A range never begins inside a
+# UTF-8 character or right after a backslash, so a quote at its start is never an escaped one.
+def split_points(buffer, count):
+    size = len(buffer)
+    points = [0]
+    for index in range(1, count):
+        pos = max(size * index // count, points[-1])
+        while pos < size and (buffer[pos] & 0xc0 == 0x80 or buffer[pos - 1] == 0x5c):
+            pos += 1
+        points.append(pos)
+    points.append(size)
+    return points
+
+
+# Number of processes to scan a buffer of `size` bytes with: one below min_size or on a single CPU
+def worker_count(workers, size, min_size):
+    cpus = os.cpu_count() or 1
+    if cpus == 1 or size < min_size:
+        return 1
+    return workers or cpus
+
+
+# Scanning a file with several worker processes, one range of the file each. The workers guess how
+# their range begins; the real position is known once the range before it is done, and the tokens are
+# taken from the guess that passed through that position (or the range is rescanned from it).
+# Yields the tokens as TokenBlocks, which are only copied out of the workers' arrays, and prints the
+# same errors as scan_file in between.
+def scan_blocks(path, workers=None, min_size=MIN_PARALLEL_SIZE):
+    buffer = map_file(path)
+    workers = worker_count(workers, len(buffer), min_size)
+    if workers == 1:
+        yield from speculate(buffer, 0, len(buffer)).blocks(0, 0, buffer, sys.stdout)
+        return
+    points = split_points(buffer, workers)
+    with ProcessPoolExecutor(workers) as executor:
+        ranges = executor.map(scan_range, [path] * workers, points[:-1], points[1:])
+        pos = 0
+        for limit, (outside, inside) in zip(points[1:], ranges):
+            if pos >= limit:  # the range is part of a lexeme the ranges before already scanned
+                continue
+            run = outside
+            index = outside.find(pos)
+            if index < 0 and inside is not None:
+                run = inside
+                index = inside.find(pos)
+            if index < 0:
+                run = speculate(buffer, pos, limit, outside)
+                index = 0
+            while True:
+                yield from run.blocks(pos, index, buffer, sys.stdout)
+                pos = run.stop
+                if run is outside or pos >= limit:
+                    break
+                index = outside.find(pos)
+                if index >= 0:
+                    run = outside  # the scan met the outside guess, which is right from here on
+                else:
+                    run = speculate(buffer, pos, limit)
+                    index = 0
+
+
+# The tokens of a file scanned by several worker processes (see scan_blocks), the same tokens and errors
+# as scan_file. Files that are scanned in one process go straight through scan_buffer.
+def scan_parallel(path, workers=None, spans=True, min_size=MIN_PARALLEL_SIZE):
+    buffer = map_file(path)
+    if worker_count(workers, len(buffer), min_size) == 1:
+        yield from scan_buffer(buffer, spans)
+        return
+    for block in scan_blocks(path, workers, min_size):
+        yield from block.tokens(spans)
+
+
+if __name__ == "__main__":
+    for token in scan_parallel(sys.argv[1]):
+        print(format_token(token))
@@ -0,0 +1,284 @@
+import contextlib
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+
+import binary_format
+from diagnostics import Diagnostic, Diagnostics
+from tokens import SpanToken, Token, line_index
+
+# Length of an entry's JSON header, the first bytes of the entry
+HEADER_SIZE = struct.Struct("<I")
+
+
+# Cache of frontend results keyed by the content of the input, so a payload seen again is not scanned
+# and parsed again. Entries are kept encoded, which makes their size known and gives every hit its own
+# copy of the result. An entry is data only, never code: the length of a JSON header (what the stage
+# printed and its errors), the header, then the tokens or tree in the form of binary_format. The least recently used entries are dropped past max_entries or max_bytes.
+# With a directory, entries are also written there, so they outlive the process and are shared with others.
+# The directory is kept under max_disk_bytes (None for no limit): past it, the files used longest ago are
+# removed until it is down to three quarters of that, a file's modification time being its last use.
+# stages are the callables run on a miss, by name ("scan", "syntax", "semantic", "validate", see
+# frontend.make_cache), and version is the version of their results, part of every key.
+class ResultCache:
+    def __init__(self, stages, version, max_entries=1024, max_bytes=64 << 20, directory=None,
+                 max_disk_bytes=1 << 30):
+        self.stages = stages
+        self.version = version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()  # key -> encoded entry, least recently used first
+        self.size = 0  # bytes of the entries in memory
+        self.disk_size = None  # bytes of the files in the directory, counted when first needed
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def stats(self):
+        stats = {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "evictions": self.evictions,
+                 "entries": len(self.entries), "bytes": self.size}
+        if self.directory is not None:
+            if self.disk_size is None:
+                self.disk_size = sum(size for _, _, size in self.disk_files())
+            stats["disk_evictions"] = self.disk_evictions
+            stats["disk_bytes"] = self.disk_size
+        return stats
+
+    # Only sources that are wholly in memory can be hashed up front
+    @staticmethod
+    def accepts(source):
+        return isinstance(source, (str, bytes, bytearray, mmap.mmap))
+
+    # Key of a result: the input, what kind of object it was (offsets of str and bytes differ), the stages'
+    # version, the stage and its options
+    def key(self, source, stage, *options):
+        kind = "str" if isinstance(source, str) else "bytes"
+        digest = hashlib.sha256(f"{self.version}|{kind}|{stage}|{options}|".encode())
+        digest.update(source.encode("utf-8") if isinstance(source, str) else source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    # Encoded entry of a key, None when it is not cached
+    def get(self, key):
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+        if self.directory is not None:
+            path = self.path(key)
+            try:
+                with open(path, "rb") as file:
+                    data = file.read()
+                os.utime(path)  # used now, the last to be removed
+            except FileNotFoundError:  # never written, or removed by another process
+                pass
+            else:
+                self.disk_hits += 1
+                self.remember(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        self.remember(key, data)
+        if self.directory is not None:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)  # readers never see a partly written entry
+            if self.disk_size is None:
+                self.disk_size = sum(size for _, _, size in self.disk_files())
+            else:
+                self.disk_size += len(data)
+            if self.max_disk_bytes is not None and self.disk_size > self.max_disk_bytes:
+                self.trim_disk()
+
+    # Files of the entries in the directory as (modification time, path, size)
+    def disk_files(self):
+        files = []
+        with os.scandir(self.directory) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".tmp"):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        files.append((stat.st_mtime, entry.path, stat.st_size))
+        return files
+
+    # Removing the files used longest ago. Other processes write to the directory too, so it is counted
+    # again first; a file another process removed meanwhile is not counted as an eviction.
+    def trim_disk(self):
+        files = sorted(self.disk_files())
+        size = sum(size for _, _, size in files)
+        target = self.max_disk_bytes * 3 // 4
+        for _, path, file_size in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            else:
+                self.disk_evictions += 1
+            size -= file_size
+        self.disk_size = size
+
+    def remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = data
+        self.size += len(data)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.size -= len(dropped)
+            self.evictions += 1
+
+    # Error records and binary body of the entry of a key, replaying what the stages printed when it was made
+    def load(self, key):
+        data = self.get(key)
+        if data is None:
+            return None
+        (size,) = HEADER_SIZE.unpack_from(data)
+        header = json.loads(data[HEADER_SIZE.size:HEADER_SIZE.size + size])
+        sys.stdout.write(header["messages"])
+        return header["errors"], io.BytesIO(data[HEADER_SIZE.size + size:])
+
+    def store(self, key, messages, errors=(), body=b""):
+        header = json.dumps({"messages": messages, "errors": errors}).encode()
+        self.put(key, HEADER_SIZE.pack(len(header)) + header + body)
+
+    # The stages through the cache, same arguments and results as in frontend.py
+
+    def scan(self, source):
+        key = self.key(source, "tokens")
+        entry = self.load(key)
+        if entry is not None:
+            return list(binary_format.TokenReader(entry[1]))
+        with capture() as messages:
+            tokens = list(self.stages["scan"](source))
+        body = io.BytesIO()
+        binary_format.dump_tokens(tokens, body)
+        self.store(key, messages.getvalue(), body=body.getvalue())
+        return tokens
+
+    def parse_syntax(self, source, compact=False):
+        key = self.key(source, "syntax")
+        entry = self.load(key)
+        if entry is not None:
+            return binary_format.load_tree(entry[1], compact)[0]
+        with capture() as messages:
+            tree = self.stages["syntax"](source, compact)
+        self.store(key, messages.getvalue(), body=encode_tree(tree, "syntax"))
+        return tree
+
+    def parse_semantic(self, source, compact=False, errors=None, max_errors=None):
+        errors = Diagnostics(max_errors) if errors is None else errors
+        if errors.lines is None:
+            errors.lines = line_index(source)
+        key = self.key(source, "semantic", max_errors)
+        entry = self.load(key)
+        if entry is not None:
+            records, body = entry
+            errors.extend(decode_errors(records, source, errors.lines))
+            return binary_format.load_tree(body, compact)[0]
+        known = len(errors)
+        with capture() as messages:
+            tree = self.stages["semantic"](source, compact, errors)
+        self.store(key, messages.getvalue(), encode_errors(errors[known:]), encode_tree(tree, "semantic"))
+        return tree
+
+    def validate(self, source, errors=None, max_errors=None):
+        errors = Diagnostics(max_errors) if errors is None else errors
+        if errors.lines is None:
+            errors.lines = line_index(source)
+        key = self.key(source, "validate", max_errors)
+        entry = self.load(key)
+        if entry is not None:
+            errors.extend(decode_errors(entry[0], source, errors.lines))
+            return errors
+        known = len(errors)
+        with capture() as messages:
+            self.stages["validate"](source, errors)
+        self.store(key, messages.getvalue(), encode_errors(errors[known:]))
+        return errors
+
+
+# One cache per directory in each process, for worker processes that are only handed the directory
+caches = {}
+
+
+def shared_cache(directory, stages, version):
+    if directory not in caches:
+        caches[directory] = ResultCache(stages, version, directory=directory)
+    return caches[directory]
+
+
+# Collecting what is printed while still printing it
+@contextlib.contextmanager
+def capture():
+    messages = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(messages):
+            yield messages
+    finally:
+        sys.stdout.write(messages.getvalue())
+
+
+# A tree in the binary form of a stage's tree
+def encode_tree(root, stage):
+    body = io.BytesIO()
+    binary_format.dump_tree(root, body, stage)
+    return body.getvalue()
+
+
+# Errors with their tokens reduced to offsets into the source where there are some
+# (other tokens keep their value and the offset they were scanned at, if any)
+def encode_errors(errors):
+    records = []
+    for error in errors:
+        token = error.token
+        if token is None:
+            records.append((error.code, error.message, error.position, None, None, None, None))
+        elif type(token) is SpanToken:
+            records.append((error.code, error.message, error.position, token.type, token.start, token.end, None))
+        else:
+            records.append((error.code, error.message, error.position, token.type, token.value, None,
+                            getattr(token, "start", None)))
+    return records
+
+
+# Errors back from their records, span tokens point into the source of the hit (the same content),
+# and positions are found with lines (a tokens.LineIndex of that source)
+def decode_errors(records, source, lines=None):
+    errors = []
+    for code, message, position, type_, start, end, offset in records:
+        if type_ is None:
+            token = None
+        elif end is None:
+            token = Token(type_, start, offset)
+        else:
+            token = SpanToken(type_, source, start, end)
+        errors.append(Diagnostic(code, message, token, position, lines))
+    return errors
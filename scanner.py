@@ -1,8 +1,36 @@
-# Individual token
-class Token:
-    def __init__(self, type, value):
-        self.type = type
-        self.value = value
+import codecs
+import mmap
+import re
+
+from tokens import LineIndex, SpanToken, Token, format_token
+
+# Engine used by Scanner.scan_all unless one is given ("regex" or "dfa")
+DEFAULT_ENGINE = "regex"
+
+# Whole-lexeme pattern for the regex engine: skips whitespace, then matches one token.
+# The empty last branch leaves lastgroup as None for characters that need the DFA.
+LEXEME = re.compile(r'''\s*(?:
+    (?P<STR>"(?:[^"\\]+|\\"?)*)(?P<END>"?)
+    |(?P<NUM>[0-9.eE+\-]+)
+    |(?P<BOOL>true|false)
+    |(?P<NULL>null)
+    |(?P<PUNCT>[\[\]{}:,])
+    |)''', re.VERBOSE)
+
+# The same pattern over UTF-8 bytes (bytes, mmap). Bytes \s is ASCII only, so the ASCII characters
+# str.isspace() accepts are listed; non-ASCII characters outside strings are decoded one at a time.
+BYTES_LEXEME = re.compile(rb'''[\t\n\x0b\x0c\r\x1c-\x1f ]*(?:
+    (?P<STR>"(?:[^"\\]+|\\"?)*)(?P<END>"?)
+    |(?P<NUM>[0-9.eE+\-]+)
+    |(?P<BOOL>true|false)
+    |(?P<NULL>null)
+    |(?P<PUNCT>[\[\]{}:,])
+    |)''', re.VERBOSE)
+NUMBER_RUN = re.compile(rb'[0-9.eE+\-]*')
+
+# Number lexemes of the JSON grammar, less those the semantic parser reports (a 0 right before an exponent);
+# the groups are the fraction and the exponent that make a float
+JSON_NUMBER = re.compile(r'-?(?!0[eE])(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?')
 
 # DFA class
 class DFA:
@@ -19,6 +47,7 @@ class DFA:
 
     def scan_string(self):
         string_str = ""
+        start = self.scanner.current_pos
         self.scanner.advance()
         while self.scanner.current_char is not None and self.scanner.current_char != '"':
             if self.scanner.current_char == '\\':
@@ -33,7 +62,7 @@ class DFA:
                 string_str += self.scanner.current_char
                 self.scanner.advance()
         if self.scanner.current_char is None:
-            print("ERROR: String was not closed")
+            print("ERROR: String was not closed" + self.scanner.where(start))
         self.scanner.advance()
         return Token("STR", f'"{string_str}"')
 
@@ -66,27 +95,44 @@ class DFA:
                 self.scanner.advance()
                 self.scanner.advance()
                 self.scanner.advance()
-                return Token(None, "NULL")
+                return Token("NULL")
         return None
 
 # Scanner class
 class Scanner:
     # Initialize the scanner
-    def __init__(self, input_str):
+    def __init__(self, input_str, engine=None, spans=False, intern=None, numbers=False):
         self.input_str = input_str
         self.current_pos = 0
         self.current_char = self.input_str[self.current_pos] if self.current_pos < len(self.input_str) else None
         self.dfa = DFA(self)
+        self.engine = engine or DEFAULT_ENGINE
+        self.spans = spans  # regex engine only: STR/NUM tokens point into input_str instead of copying
+        self.intern = intern  # regex engine only: a tokens.InternTable that copied values are shared through
+        self.numbers = numbers  # regex engine only: valid NUM tokens carry an int or float (see number_value)
+        self.base = 0  # offset of input_str in the whole input, when it is the rest of a stream
+        self.lines = None  # tokens.LineIndex of the whole input, made for the first error message if not given
 
     # Move to the next character
     def advance(self):
         self.current_pos += 1
         self.current_char = self.input_str[self.current_pos] if self.current_pos < len(self.input_str) else None
 
+    # Jump to a position in the input
+    def seek(self, pos):
+        self.current_pos = pos
+        self.current_char = self.input_str[pos] if pos < len(self.input_str) else None
+
     # Look at the next character
     def peek(self):
         return self.input_str[self.current_pos + 1] if self.current_pos < len(self.input_str) - 1 else None
 
+    # Where an offset of input_str is, as it ends an error message
+    def where(self, pos):
+        if self.lines is None:
+            self.lines = LineIndex(self.input_str)
+        return self.lines.where(self.base + pos)
+
     # Look at previous character
     def back(self):
         return self.input_str[self.current_pos - 1] if self.current_pos > 0 else None
@@ -99,6 +145,7 @@ class Scanner:
     # Scanning the character
     def scan_char(self):
         self.skip_whitespace()
+        start = self.current_pos
         if self.current_char == '"':
             result = self.dfa.scan_string()
         elif self.current_char is None:
@@ -111,35 +158,38 @@ class Scanner:
             result = self.dfa.scan_null()
         elif self.current_char == '[':
             self.advance()
-            return Token(None, "[")
+            return Token("[", None, start)
         elif self.current_char == ']':
             self.advance()
-            return Token(None, "]")
+            return Token("]", None, start)
         elif self.current_char == '{':
             self.advance()
-            return Token(None, "{")
+            return Token("{", None, start)
         elif self.current_char == '}':
             self.advance()
-            return Token(None, "}")
+            return Token("}", None, start)
         elif self.current_char == ':':
             self.advance()
-            return Token(None, ":")
+            return Token(":", None, start)
         elif self.current_char == ',':
             self.advance()
-            return Token(None, ",")
+            return Token(",", None, start)
         else:
-            print("ERROR: Unexpected character: " + self.current_char)
+            print("ERROR: Unexpected character: " + self.current_char + self.where(start))
             self.advance()
             return
 
         if result is None:
-            print("ERROR: Failed to tokenize: " + self.current_char + self.peek())
+            print("ERROR: Failed to tokenize: " + self.current_char + self.peek() + self.where(start))
             self.advance()
             return
         else:
+            result.start = start
             return result
 
     def scan_all(self):
+        if self.engine == "regex":
+            return list(self.scan_regex())
         tokens = []
         while self.current_char is not None:
             token = self.scan_char()
@@ -147,13 +197,268 @@ class Scanner:
                 tokens.append(token)
         return tokens
 
+    # Matching whole lexemes at once, same tokens and errors as the DFA.
+    # When final is False the input may continue, so scanning stops before a lexeme that could still grow.
+    # trace(pos) is called before each step and ends the scan by returning true.
+    def scan_regex(self, final=True, trace=None):
+        text = self.input_str
+        end = len(text)
+        pos = self.current_pos
+        match_lexeme = LEXEME.match
+        spans = self.spans
+        intern = self.intern
+        numbers = self.numbers
+        while pos < end:
+            if trace is not None and trace(pos):
+                break
+            start = pos
+            match = match_lexeme(text, pos)
+            kind = match.lastgroup
+            pos = match.end()
+            if not final and (pos == end or kind is None and end - pos < 5):
+                pos = start
+                break
+            if kind == "PUNCT":
+                yield Token(text[pos - 1], None, pos - 1)
+            elif kind == "END":
+                if spans and match.group(kind):
+                    yield SpanToken("STR", text, match.start("STR"), pos)
+                elif match.group(kind):
+                    start = match.start("STR")
+                    value = text[start:pos]
+                    yield Token("STR", intern.intern(value) if intern is not None else value, start)
+                else:
+                    print("ERROR: String was not closed" + self.where(match.start("STR")))
+                    yield Token("STR", match.group("STR") + '"', match.start("STR"))
+            elif kind == "NUM" and (pos == end or text[pos] < '\x80' or not text[pos].isdigit()):
+                value = number_value(match.group(kind)) if numbers else None
+                if value is not None:
+                    yield Token("NUM", value, match.start(kind))
+                elif spans:
+                    yield SpanToken("NUM", text, match.start(kind), pos)
+                else:
+                    value = match.group(kind)
+                    yield Token("NUM", intern.intern(value) if intern is not None else value, match.start(kind))
+            elif kind == "BOOL":
+                yield Token("BOOL", match.group(kind), match.start(kind))
+            elif kind == "NULL":
+                yield Token("NULL", None, pos - 4)
+            elif pos < end:
+                # Errors and rare characters (such as non-ASCII digits) go through the DFA one step
+                self.seek(match.start(kind) if kind else pos)
+                token = self.scan_char()
+                if not final and self.current_pos >= end:
+                    pos = start
+                    break
+                pos = self.current_pos
+                if token is not None:
+                    yield token
+        self.seek(pos)
+
+
+# The character starting at a position of a UTF-8 buffer, and its length in bytes
+def char_at(buffer, pos):
+    lead = buffer[pos]
+    size = 1 if lead < 0xc0 else 2 if lead < 0xe0 else 3 if lead < 0xf0 else 4
+    char = buffer[pos:pos + size].decode("utf-8", "replace")
+    return (char, size) if len(char) == 1 else (char[0], 1)
+
+
+# End of a number in a UTF-8 buffer, decoding only the non-ASCII characters
+def number_end(buffer, pos):
+    end = len(buffer)
+    pos = NUMBER_RUN.match(buffer, pos).end()
+    while pos < end and buffer[pos] >= 0x80:
+        char, size = char_at(buffer, pos)
+        if not char.isdigit():
+            break
+        pos = NUMBER_RUN.match(buffer, pos + size).end()
+    return pos
+
+
+# Value of a number lexeme, checked against the JSON number grammar as it is converted: an int, or a float
+# if it has a fraction or an exponent. None for lexemes outside the grammar, their tokens keep the lexeme
+# for the semantic parser to report.
+def number_value(text):
+    match = JSON_NUMBER.fullmatch(text)
+    if match is None:
+        return None
+    return int(text) if match.lastindex is None else float(text)
+
+
+# Scanning a whole UTF-8 buffer (bytes, bytearray or mmap) without decoding it first.
+# Gives the same tokens and errors as Scanner on the decoded text; with spans the STR and NUM
+# tokens only keep their byte offsets, otherwise their values are decoded right away.
+# Scanning may begin at any offset pos; trace(pos) is called before each step and ends the scan by returning true.
+# Without spans, values can be shared through intern (a tokens.InternTable).
+# With numbers, NUM tokens of valid numbers carry an int or float instead (see number_value).
+def scan_buffer(buffer, spans=True, pos=0, trace=None, intern=None, numbers=False):
+    end = len(buffer)
+    match_lexeme = BYTES_LEXEME.match
+    lines = LineIndex(buffer)  # for error messages, built for the first one
+    while pos < end:
+        if trace is not None and trace(pos):
+            return
+        match = match_lexeme(buffer, pos)
+        kind = match.lastgroup
+        pos = match.end()
+        if kind == "PUNCT":
+            yield Token(chr(buffer[pos - 1]), None, pos - 1)
+        elif kind == "END":
+            start = match.start("STR")
+            if not match.group(kind):
+                print("ERROR: String was not closed" + lines.where(start))
+                yield Token("STR", buffer[start:pos].decode("utf-8") + '"', start)
+            elif spans:
+                yield SpanToken("STR", buffer, start, pos)
+            else:
+                value = buffer[start:pos].decode("utf-8")
+                yield Token("STR", intern.intern(value) if intern is not None else value, start)
+        elif kind == "NUM":
+            start = match.start(kind)
+            if pos < end and buffer[pos] >= 0x80:
+                pos = number_end(buffer, pos)
+            value = number_value(buffer[start:pos].decode("utf-8")) if numbers else None
+            if value is not None:
+                yield Token("NUM", value, start)
+            elif spans:
+                yield SpanToken("NUM", buffer, start, pos)
+            else:
+                value = buffer[start:pos].decode("utf-8")
+                yield Token("NUM", intern.intern(value) if intern is not None else value, start)
+        elif kind == "BOOL":
+            start = match.start(kind)
+            yield Token("BOOL", "true" if pos - start == 4 else "false", start)
+        elif kind == "NULL":
+            yield Token("NULL", None, pos - 4)
+        elif pos < end:
+            char, size = char_at(buffer, pos)
+            if char.isspace():
+                pos += size
+            elif char.isdigit():
+                start = pos
+                pos = number_end(buffer, pos)
+                if spans:
+                    yield SpanToken("NUM", buffer, start, pos)
+                else:
+                    yield Token("NUM", buffer[start:pos].decode("utf-8"), start)
+            else:
+                # Errors are reported by the DFA, they always use up a single character
+                scanner = Scanner(buffer[pos:pos + 24].decode("utf-8", "ignore"), "dfa")
+                scanner.base = pos
+                scanner.lines = lines
+                scanner.scan_char()
+                pos += size
+
+
+# Line and column of offsets in the window of a stream scanner (its input_str), from the number of lines
+# that have left the window and where the last of them starts, so memory does not grow with the input
+class WindowLines:
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.line = 1  # line of the first character of the window
+        self.line_start = 0  # offset at which that line starts
+
+    # The text at offset base leaving the window
+    def drop(self, text, base):
+        newline = text.rfind("\n")
+        if newline >= 0:
+            self.line += text.count("\n")
+            self.line_start = base + newline + 1
+
+    def line_column(self, offset):
+        base = self.scanner.base
+        before = self.scanner.input_str[:offset - base]
+        newline = before.rfind("\n")
+        if newline < 0:
+            return self.line, 1 + offset - self.line_start
+        return self.line + before.count("\n"), offset - base - newline
+
+    where = LineIndex.where
+
+
+# Scanning input that arrives in chunks of str or UTF-8 bytes. Token offsets count characters from the
+# start of the input. The lines of what has arrived go into `lines` (a tokens.LineIndex without a source)
+# when it is given; scanner errors are placed with WindowLines either way.
+class StreamScanner:
+    def __init__(self, intern=None, lines=None):
+        self.scanner = Scanner("", "regex", intern=intern)
+        self.lines = lines
+        self.window = WindowLines(self.scanner)
+        self.scanner.lines = self.window if lines is None else lines
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.pending = []
+        self.pending_size = 0
+        self.stalled = 0
+        self.received = 0  # characters
+
+    # Add a chunk and get back the tokens it completed
+    def feed(self, chunk):
+        if isinstance(chunk, (bytes, bytearray)):
+            chunk = self.decoder.decode(chunk)
+        if self.lines is not None:
+            self.lines.add(chunk, self.received)
+        self.received += len(chunk)
+        self.pending.append(chunk)
+        self.pending_size += len(chunk)
+        if self.pending_size < self.stalled:  # still inside a long lexeme, rescanning it now is wasted work
+            return []
+        return self.scan(False)
+
+    # End of input, get back the remaining tokens
+    def close(self):
+        rest = self.decoder.decode(b"", True)
+        if self.lines is not None:
+            self.lines.add(rest, self.received)
+        self.received += len(rest)
+        self.pending.append(rest)
+        return self.scan(True)
+
+    def scan(self, final):
+        scanner = self.scanner
+        if self.lines is None:
+            self.window.drop(scanner.input_str[:scanner.current_pos], scanner.base)
+        scanner.base += scanner.current_pos
+        scanner.input_str = scanner.input_str[scanner.current_pos:] + "".join(self.pending)
+        scanner.seek(0)
+        self.pending = []
+        self.pending_size = 0
+        tokens = list(scanner.scan_regex(final))
+        self.stalled = len(scanner.input_str) - scanner.current_pos
+        if scanner.base:
+            for token in tokens:
+                token.start += scanner.base
+        return tokens
+
+
+# Lazily scanning a file object, a str/bytes, or an iterable of chunks.
+# Pass a tokens.LineIndex() as lines to have the lines of the input recorded in it as it is read.
+def scan_stream(source, chunk_size=1 << 16, intern=None, lines=None):
+    if isinstance(source, (str, bytes, bytearray)):
+        chunks = [source]
+    elif hasattr(source, "read"):
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+    else:
+        chunks = source
+    stream = StreamScanner(intern, lines)
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.close()
+
+
+# Memory-mapping a file read-only, so scanning it only loads the pages it touches.
+# The map stays open as long as something (such as a SpanToken) refers to it.
+def map_file(path):
+    with open(path, "rb") as file:
+        if file.seek(0, 2) == 0:  # empty files cannot be mapped
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# Scanning a file through a memory map
+def scan_file(path, spans=True):
+    return scan_buffer(map_file(path), spans)
+
 if __name__ == "__main__":
-    with open("test_11.txt", "r") as file:
-        input_str = file.read()
-    scanner = Scanner(input_str)
-    tokens = scanner.scan_all()
-    for token in tokens:
-        if token.type is not None:
-            print(f"<{token.type}, {token.value}>", end="\n")
-        else:
-            print(f"<{token.value}>", end="\n")
+    for token in scan_file("test_11.txt"):
+        print(format_token(token))
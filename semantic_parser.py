@@ -1,19 +1,18 @@
-# Token representation
-class Token:
-    def __init__(self, type, value=None):
-        self.type = type
-        self.value = value
-
-    def __repr__(self):
-        return f"<{self.type}{', ' + str(self.value) if self.value else ''}>"
+from array import array
 
+from diagnostics import Diagnostics, TooManyErrors
+from iterative import DEFAULT_MAX_DEPTH, run
+from tokens import InternTable, Token, TokenStream, read_tokens
+from tree_output import write_tree
 
-# Errors list
-errors = []
+# Ints up to this size are exact as floats
+MAX_EXACT_FLOAT = 1 << 53
 
 
 # Node of the abstract syntax tree
 class Node:
+    __slots__ = ("type", "value", "children")
+
     def __init__(self, type_, value=None):
         self.type = type_
         self.value = value
@@ -22,234 +21,447 @@ class Node:
     def add_child(self, child):  # Creating children of the tree
         self.children.append(child)
 
-    # Finding latest comma
-    def latest_comma_child(self):
-        if self.type == "," and all(child.type != "," for child in self.children):  # Base case
-            return self
-        deepest_comma = None
-        for child in self.children:
-            child_comma = child.latest_comma_child()  # Glue case
-            if child_comma:
-                if not deepest_comma or self.depth_level(child_comma) > self.depth_level(deepest_comma):
-                    deepest_comma = child_comma
-        return deepest_comma
-
-    # Helper method
-    def depth_level(self, node, current_depth=0):
-        if self == node:  # Base case
-            return current_depth
-        for child in self.children:
-            child_depth = child.depth_level(node, current_depth + 1)  # Glue case
-            if child_depth != -1:
-                return child_depth
-        return -1
-
-    # Output
-    def print_output(self, file, indent=0):
-        if len(errors) == 0:  # when no errors
-            if self.type != "":
-                file.write(" " * indent + f"{self.type} {self.value if self.value else ''}\n")  # base case
-            else:
-                indent -= 5
-            for child in self.children:
-                child.print_output(file, indent + 5)  # glue case
-        else:
-            for error in errors:
-                file.write(f"{error}\n")
-
-
+    # Output, the tree or else the errors of the parse (Parser.errors); form="jsonl" writes both as JSON lines
+    def print_output(self, file, errors=(), indent=0, form="text"):
+        write_tree(self, file, "semantic", errors, form, indent)
+
+
+# The array `values` (typecode "q", or "d" once a float comes) with a number added, or None when that number
+# or one before it cannot be kept exactly: an int past 64 bits, or past 2**53 among floats
+def pack(values, value):
+    if type(value) is float and values.typecode == "q":
+        if any(abs(number) > MAX_EXACT_FLOAT for number in values):
+            return None
+        values = array("d", values)
+    elif type(value) is int and values.typecode == "d" and abs(value) > MAX_EXACT_FLOAT:
+        return None
+    try:
+        values.append(value)
+    except OverflowError:
+        return None
+    return values
+
+
+# Recording an error: "{code} ERROR AT {where}: {what}"
+def report(errors, code, where, what, token, position):
+    errors.add(code, f"{code} ERROR AT {where}: {what}", token, position)
+
+
+# Parsing routines are generators: they yield the routine for a nested value and get its node back,
+# so deep nesting uses the explicit stack in iterative.run instead of recursion.
+# Errors go to the parser's own Diagnostics (pass errors= to collect them elsewhere),
+# with max_errors the parse stops after that many. With intern=True leaves with the same value are one shared Node.
+# NUM tokens may carry an int or float (scanned with numbers=True), those are valid numbers and are not checked.
+# With numbers=True a list made only of them is one "numbers" node holding their values in an array:
+# array('q') for ints, array('d') once there is a float among them.
 class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
+    def __init__(self, tokens, max_depth=DEFAULT_MAX_DEPTH, tree=None, errors=None, max_errors=None, intern=False,
+                 numbers=False):
+        self.tokens = TokenStream(tokens)  # any iterable of tokens, pulled on demand
         self.current_token = None
         self.position = -1
         self.advance()
         self.keys_stack = [{}]
         self.comma_stack = []
+        self.depth = 0
+        self.max_depth = max_depth
+        self.errors = Diagnostics(max_errors) if errors is None else errors
+        self.numbers = numbers
+        if intern:
+            self.leaves = InternTable()
+            self.leaf = self.shared_leaf
+        if tree is not None:  # building into another tree representation, such as compact.CompactTree
+            self.node = tree.node
+            self.add_child = tree.add_child
+            self.leaf = tree.leaf
+            self.value_of = tree.value_of
+
+    # Nodes are only made and linked through these methods, so the tree representation can be swapped
+    def node(self, type_, value=None):
+        return Node(type_, value)
+
+    # Leaf for a token's value, an AST leaf is named by the value itself
+    def leaf(self, type_, token):
+        return Node(token.value)
+
+    def shared_leaf(self, type_, token):
+        value = token.value
+        node = self.leaves.get(value)
+        if node is None:
+            node = Node(value)
+            if type(value) is str:  # not a missing key or a number's value
+                self.leaves.keep(value, node, len(value))
+        return node
+
+    def add_child(self, parent, child):
+        parent.add_child(child)
+
+    def value_of(self, node):
+        return node.value
+
+    def error(self, code, where, what, token, position):
+        report(self.errors, code, where, what, token, position)
 
     # Move ahead
     def advance(self):
         self.position += 1
-        if self.position < len(self.tokens):
-            self.current_token = self.tokens[self.position]
-        else:
-            self.current_token = None
+        self.current_token = self.tokens.advance()
 
     def previous(self):
-        return self.tokens[self.position - 1] if self.position > 0 else None
+        return self.tokens.previous
 
     def next(self):
-        return self.tokens[self.position + 1] if self.position < len(self.tokens) - 1 else None
+        return self.tokens.peek(1)
 
     # Move if current is what was expected
     def eat(self, token_type):
         if self.current_token and self.current_token.type == token_type:
             self.advance()
 
+    # Move past a whole list or dict
+    def skip_nested(self):
+        level = 0
+        while self.current_token:
+            if self.current_token.type in ("[", "{"):
+                level += 1
+            elif self.current_token.type in ("]", "}"):
+                level -= 1
+            self.advance()
+            if level == 0:
+                break
+
     def parse(self):
-        return self.value()
+        try:
+            return run(self.value())
+        except TooManyErrors:  # failing fast, the rest of the input is not looked at
+            return self.node("")
 
     # Parsing values
     def value(self):
-        node = Node("")
+        node = self.node("")
         token = self.current_token
         if token.type == "STR":
             # Error checking
-            if token.value == "\"true\"" or token.value == "\"false\"":
-                errors.append(f"TYPE 7 ERROR AT {token.value}: Reserved Words as Strings.")
+            text = token.value  # read once, span tokens slice it out of the source each time
+            if text == "\"true\"" or text == "\"false\"":
+                self.error("TYPE 7", text, "Reserved Words as Strings.", token, self.position)
             self.eat("STR")
-            node.add_child(Node(token.value))
+            self.add_child(node, self.leaf(None, token))
         elif token.type == "NUM":
             # Error checking
-            if token.value.startswith("0") and len(token.value) > 1 and token.value[1] != '.':
-                errors.append(f"TYPE 3 ERROR AT {token.value}: Invalid Numbers.")
-            elif token.value.startswith("+"):
-                errors.append(f"TYPE 3 ERROR AT {token.value}: Invalid Numbers.")
-            if token.value.count('.') == 1 and (token.value.startswith('.') or token.value.endswith('.')):
-                errors.append(f"TYPE 1 ERROR AT {token.value}: Invalid Decimal Numbers.")
+            text = token.value
+            if type(text) is str:  # an int or float value is a valid number already
+                if text.startswith("0") and len(text) > 1 and text[1] != '.':
+                    self.error("TYPE 3", text, "Invalid Numbers.", token, self.position)
+                elif text.startswith("+"):
+                    self.error("TYPE 3", text, "Invalid Numbers.", token, self.position)
+                if text.count('.') == 1 and (text.startswith('.') or text.endswith('.')):
+                    self.error("TYPE 1", text, "Invalid Decimal Numbers.", token, self.position)
             self.eat("NUM")
-            node.add_child(Node(token.value))
+            self.add_child(node, self.leaf(None, token))
         elif token.type == "BOOL":
             self.eat("BOOL")
-            node.add_child(Node(token.value))
+            self.add_child(node, self.leaf(None, token))
         elif token.type == "NULL":
             self.eat("NULL")
-            node.add_child(Node("NULL"))
+            self.add_child(node, self.node("NULL"))
+        elif token.type in ("{", "[") and self.depth >= self.max_depth:
+            self.error("DEPTH", token.type, f"Nesting Deeper Than {self.max_depth} Levels.", token, self.position)
+            self.skip_nested()
         elif token.type == "{":
-            node.add_child(self.parse_dict())
+            self.add_child(node, (yield self.parse_dict()))
         elif token.type == "[":
-            node.add_child(self.parse_list())
+            self.add_child(node, (yield self.parse_list()))
         return node
 
     # Parsing list
     def parse_list(self):
+        self.depth += 1
         if self.previous() and self.previous().type == ",":
-            node = Node("list")
+            node = self.node("list")
         else:
-            node = Node("")
+            node = self.node("")
         self.eat("[")
         types = set()
 
         # Content inside list
-        if self.current_token and self.current_token.type != "]":
-            types.add(self.current_token.type)
-            value_node = self.value()
-            if self.current_token and self.current_token.type != ",":
-                node.add_child(value_node)
+        numbers = self.number_run() if self.numbers else None
+        if numbers and numbers[0] is not None and self.current_token and self.current_token.type == "]":
+            self.add_child(node, self.node("numbers", numbers[0]))
+        elif self.current_token and self.current_token.type != "]" or numbers:
+            types.add("NUM" if numbers else self.current_token.type)
+            if numbers:  # the list goes on with something else, or its numbers are not exact in an array: nodes after all
+                current_comma = self.number_nodes(node, numbers[1])
             else:
-                comma = Node(",")
-                node.add_child(comma)
-                comma.add_child(value_node)
-
-            current_comma = node.latest_comma_child()
+                value_node = yield self.value()
+                # The comma chain grows from its tail, no need to search the tree for it
+                if self.current_token and self.current_token.type != ",":
+                    self.add_child(node, value_node)
+                    current_comma = None
+                else:
+                    current_comma = self.node(",")
+                    self.add_child(node, current_comma)
+                    self.add_child(current_comma, value_node)
             self.comma_stack.append(current_comma)
 
             while self.current_token and self.current_token.type == ",":
                 # comma
                 self.eat(",")
-                comma = Node(",")
+                comma = self.node(",")
                 if self.next() and self.next().type != "]":
-                    current_comma.add_child(comma)
+                    self.add_child(current_comma, comma)
                     current_comma = comma
 
                 # additional value
-                if self.current_token.type != "[" and self.current_token.type != "]":
-                    types.add(self.current_token.type)
-                value_node = self.value()
+                element, position = self.current_token, self.position
+                if element.type != "[" and element.type != "]":
+                    types.add(element.type)
+                value_node = yield self.value()
 
                 # Error checking
                 if len(types) > 1:
-                    errors.append(f"TYPE 6 ERROR AT {value_node.value}: Inconsistent Types in List Elements.")
-                current_comma.add_child(value_node)
+                    self.error("TYPE 6", self.value_of(value_node), "Inconsistent Types in List Elements.", element,
+                               position)
+                self.add_child(current_comma, value_node)
 
         self.eat("]")
         if self.comma_stack:
             self.comma_stack.pop()
+        self.depth -= 1
         return node
 
+    # Values of the numbers a list starts with, for as long as they are followed by a comma and another
+    # number with a value: (the array of them, None if they do not all fit in one exactly (see pack),
+    # the values as scanned). Nodes made after all take the scanned values, so a leaf's value never
+    # depends on the numbers next to it (no 1.0 for the 1 of [1, 2.5, "a"]).
+    # Stops on the comma before anything else, so the list can go on as usual.
+    def number_run(self):
+        token = self.current_token
+        if token is None or token.type != "NUM" or type(token.value) is str:
+            return None
+        values = array("q")
+        scanned = []
+        while True:
+            scanned.append(token.value)
+            if values is not None:
+                values = pack(values, token.value)
+            self.advance()
+            token = self.current_token
+            if token is None or token.type != ",":
+                return values, scanned
+            following = self.next()
+            if following is None or following.type != "NUM" or type(following.value) is str:
+                return values, scanned
+            self.advance()
+            token = following
+
+    # Nodes for the numbers of number_run, as value() and parse_list make them; returns the tail of the comma chain
+    def number_nodes(self, node, numbers):
+        current_comma = None
+        last = len(numbers) - 1
+        for index, number in enumerate(numbers):
+            value_node = self.node("")
+            self.add_child(value_node, self.leaf(None, Token("NUM", number)))
+            # The token after the number: a comma, or for the last one the token at hand
+            following = self.current_token if index == last else Token(",")
+            if index == 0:
+                if following and following.type != ",":
+                    self.add_child(node, value_node)
+                    continue
+                current_comma = self.node(",")
+                self.add_child(node, current_comma)
+            else:
+                comma = self.node(",")
+                if following and following.type != "]":
+                    self.add_child(current_comma, comma)
+                    current_comma = comma
+            self.add_child(current_comma, value_node)
+        return current_comma
+
     # Parsing dict
     def parse_dict(self):
+        self.depth += 1
         if self.previous() and self.previous().type == ":":
-            node = Node("dict")
+            node = self.node("dict")
         else:
-            node = Node("")
+            node = self.node("")
         self.eat("{")
         self.keys_stack.append({})
 
         # Content inside dict
         if self.current_token and self.current_token.type != "}":
             # first pair
-            pair_node = self.parse_pair()
+            pair_node = yield self.parse_pair()
+            # The comma chain grows from its tail, no need to search the tree for it
             if self.current_token and self.current_token.type != ",":
-                node.add_child(pair_node)
+                self.add_child(node, pair_node)
+                current_comma = None
             else:
-                comma = Node(",")
-                node.add_child(comma)
-                comma.add_child(pair_node)
-
-            current_comma = node.latest_comma_child()
+                current_comma = self.node(",")
+                self.add_child(node, current_comma)
+                self.add_child(current_comma, pair_node)
             self.comma_stack.append(current_comma)
 
             while self.current_token and self.current_token.type == ",":
                 # comma
                 self.eat(",")
-                comma = Node(",")
-                if self.tokens[self.position + 3].type != "}":
-                    current_comma.add_child(comma)
+                comma = self.node(",")
+                lookahead = self.tokens.peek(3)
+                if lookahead is None or lookahead.type != "}":
+                    self.add_child(current_comma, comma)
                     current_comma = comma
 
                 # additional pair
-                pair_node = self.parse_pair()
-                current_comma.add_child(pair_node)
+                pair_node = yield self.parse_pair()
+                self.add_child(current_comma, pair_node)
 
         self.eat("}")
         self.keys_stack.pop()
         if self.comma_stack:
             self.comma_stack.pop()
+        self.depth -= 1
         return node
 
     # Parsing pair
     def parse_pair(self):
         key_token = self.current_token
+        key = key_token.value
 
         # Error checking
-        if key_token.value in ["\"true\"", "\"false\""]:
-            errors.append(f"TYPE 4 ERROR AT {key_token.value}: Reserved Words as Dictionary Key.")
-        if key_token.value in ["\"\"", "\" \""]:
-            errors.append(f"TYPE 2 ERROR AT {key_token.value}: Empty Key.")
-        if key_token.value in self.keys_stack[-1]:
-            errors.append(f"TYPE 5 ERROR AT {key_token.value}: No Duplicate Keys in Dictionary.")
-        self.keys_stack[-1][key_token.value] = True
+        if key in ["\"true\"", "\"false\""]:
+            self.error("TYPE 4", key, "Reserved Words as Dictionary Key.", key_token, self.position)
+        if key in ["\"\"", "\" \""]:
+            self.error("TYPE 2", key, "Empty Key.", key_token, self.position)
+        if key in self.keys_stack[-1]:
+            self.error("TYPE 5", key, "No Duplicate Keys in Dictionary.", key_token, self.position)
+        self.keys_stack[-1][key] = True
         self.advance()
 
         self.eat(":")
-        node = Node(":")
-        node.add_child(Node(key_token.value))
-        node.add_child(self.value())
+        node = self.node(":")
+        self.add_child(node, self.leaf(None, key_token))
+        self.add_child(node, (yield self.value()))
         return node
 
 
+# Running the parser's checks over tokens without building a tree, in one pass with a stack of the open
+# lists and dicts. Finds the same errors as Parser(tokens).parse() and returns them (a Diagnostics).
+def validate(tokens, max_depth=DEFAULT_MAX_DEPTH, errors=None, max_errors=None):
+    errors = Diagnostics(max_errors) if errors is None else errors
+    tokens = iter(tokens)
+    token = next(tokens, None)
+    position = 0
+    stack = []  # a list is [types of its elements, first token of the element being parsed, its position]
+    pair = False  # a dict is the keys it has so far, its pairs start with the key
+    try:
+        while True:
+            if pair:
+                key = token.value
+                if key in ["\"true\"", "\"false\""]:
+                    report(errors, "TYPE 4", key, "Reserved Words as Dictionary Key.", token, position)
+                if key in ["\"\"", "\" \""]:
+                    report(errors, "TYPE 2", key, "Empty Key.", token, position)
+                keys = stack[-1]
+                if key in keys:
+                    report(errors, "TYPE 5", key, "No Duplicate Keys in Dictionary.", token, position)
+                keys[key] = True
+                token = next(tokens, None)
+                position += 1
+                if token and token.type == ":":
+                    token = next(tokens, None)
+                    position += 1
+                pair = False
+
+            # A value
+            kind = token.type
+            if kind == "STR":
+                text = token.value
+                if text == "\"true\"" or text == "\"false\"":
+                    report(errors, "TYPE 7", text, "Reserved Words as Strings.", token, position)
+                token = next(tokens, None)
+                position += 1
+            elif kind == "NUM":
+                text = token.value
+                if type(text) is str:
+                    if text.startswith("0") and len(text) > 1 and text[1] != '.':
+                        report(errors, "TYPE 3", text, "Invalid Numbers.", token, position)
+                    elif text.startswith("+"):
+                        report(errors, "TYPE 3", text, "Invalid Numbers.", token, position)
+                    if text.count('.') == 1 and (text.startswith('.') or text.endswith('.')):
+                        report(errors, "TYPE 1", text, "Invalid Decimal Numbers.", token, position)
+                token = next(tokens, None)
+                position += 1
+            elif kind == "BOOL" or kind == "NULL":
+                token = next(tokens, None)
+                position += 1
+            elif (kind == "[" or kind == "{") and len(stack) >= max_depth:
+                report(errors, "DEPTH", kind, f"Nesting Deeper Than {max_depth} Levels.", token, position)
+                level = 0
+                while token:
+                    if token.type in ("[", "{"):
+                        level += 1
+                    elif token.type in ("]", "}"):
+                        level -= 1
+                    token = next(tokens, None)
+                    position += 1
+                    if level == 0:
+                        break
+            elif kind == "[":
+                token = next(tokens, None)
+                position += 1
+                if token and token.type != "]":
+                    stack.append([{token.type}, None, 0])
+                    continue
+                if token:
+                    token = next(tokens, None)
+                    position += 1
+            elif kind == "{":
+                token = next(tokens, None)
+                position += 1
+                if token and token.type != "}":
+                    stack.append({})
+                    pair = True
+                    continue
+                if token:
+                    token = next(tokens, None)
+                    position += 1
+
+            # The value is done: go on to the next element of its list or dict, or close them
+            while stack:
+                frame = stack[-1]
+                if type(frame) is list:
+                    if frame[1] is not None and len(frame[0]) > 1:
+                        report(errors, "TYPE 6", None, "Inconsistent Types in List Elements.", frame[1], frame[2])
+                    if token and token.type == ",":
+                        token = next(tokens, None)
+                        position += 1
+                        if token.type != "[" and token.type != "]":
+                            frame[0].add(token.type)
+                        frame[1] = token
+                        frame[2] = position
+                        break
+                    if token and token.type == "]":
+                        token = next(tokens, None)
+                        position += 1
+                else:
+                    if token and token.type == ",":
+                        token = next(tokens, None)
+                        position += 1
+                        pair = True
+                        break
+                    if token and token.type == "}":
+                        token = next(tokens, None)
+                        position += 1
+                stack.pop()
+            else:
+                return errors
+    except TooManyErrors:  # failing fast, the rest of the input is not looked at
+        return errors
+
+
 # Recognize tokens from file
 def tokenize(file_path):
-    tokens = []
-    # Removing brackets to get token content
-    matches = {
-        "<STR,": "STR", "<NUM,": "NUM", "<BOOL,": "BOOL", "<NULL>": "NULL", "<[>": "[", "<]>": "]", "<{>": "{",
-        "<}>": "}", "<,>": ",", "<:>": ":"
-    }
-    with open(file_path, "r") as file:
-        for line in file:
-            line = line.strip()
-            if line.startswith("<STR,") or line.startswith("<NUM,") or line.startswith(
-                    "<BOOL,"):  # when there is an attached value
-                extract = line[1:-1].split(", ")
-                type = extract[0]
-                value = extract[1]
-                tokens.append(Token(matches[f"<{type},"], value))
-            elif line in matches:
-                tokens.append(Token(matches[line]))  # Adding token to list
-
-    return tokens
+    return read_tokens(file_path)
 
 
 # Main program
@@ -258,5 +470,5 @@ if __name__ == "__main__":
     parser = Parser(tokens)
     parsing = parser.parse()
     with open("output.txt", "w") as output_file:
-        parsing.print_output(output_file)
+        parsing.print_output(output_file, parser.errors)
     print("Written to output.txt!")
@@ -0,0 +1,100 @@
+import contextlib
+import time
+from collections import Counter
+
+from iterative import walk
+
+
+# Measurements of a run of the frontend: time per stage, tokens by type, nodes, depth, errors and input size.
+# Nothing is measured unless a Stats is passed in (stats=None), so runs without one cost nothing extra.
+# The parsers pull their tokens from the scanner as they go, so the time spent making tokens is taken
+# out of the stage that asked for them and counted under "scan". A callback, if given, is called with
+# (stage, seconds) as each stage ends.
+class Stats:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.seconds = Counter()  # by stage
+        self.tokens = Counter()  # by type
+        self.nodes = 0
+        self.max_depth = 0
+        self.errors = 0
+        self.size = 0  # characters of str inputs, bytes of the others
+        self.scan_seconds = 0.0
+
+    # Timing a stage, less the scanning done inside it
+    @contextlib.contextmanager
+    def stage(self, name):
+        scanned = self.scan_seconds
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start - (self.scan_seconds - scanned)
+            self.seconds["scan"] = self.scan_seconds
+            self.seconds[name] += elapsed
+            if self.callback is not None:
+                self.callback(name, elapsed)
+
+    # Passing tokens through, timing the scanner that makes them and counting them by type
+    def scanned(self, tokens):
+        counts = self.tokens
+        clock = time.perf_counter
+        tokens = iter(tokens)
+        while True:
+            start = clock()
+            token = next(tokens, None)
+            self.scan_seconds += clock() - start
+            if token is None:
+                return
+            counts[token.type] += 1
+            yield token
+
+    def input(self, source):
+        if hasattr(source, "__len__"):
+            self.size += len(source)
+
+    # Counting the nodes of a tree and how deep it goes (the root is at depth 0)
+    def tree(self, root):
+        for _, depth in walk(root):
+            self.nodes += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def as_dict(self):
+        return {"seconds": dict(self.seconds), "total_seconds": self.total_seconds, "tokens": dict(self.tokens),
+                "nodes": self.nodes, "max_depth": self.max_depth, "errors": self.errors, "size": self.size}
+
+    # Adding the measurements of another run, a Stats or its as_dict()
+    def merge(self, other):
+        other = other.as_dict() if isinstance(other, Stats) else other
+        self.seconds.update(other["seconds"])
+        self.scan_seconds = self.seconds["scan"]
+        self.tokens.update(other["tokens"])
+        self.nodes += other["nodes"]
+        self.max_depth = max(self.max_depth, other["max_depth"])
+        self.errors += other["errors"]
+        self.size += other["size"]
+
+    def report(self, file):
+        total = self.total_seconds
+        for stage, seconds in self.seconds.items():
+            if seconds or stage != "scan":
+                file.write(f"{stage:<10} {seconds:10.4f}s  {seconds / total if total else 0:6.1%}\n")
+        file.write(f"{'total':<10} {total:10.4f}s\n")
+        if total and self.size:
+            file.write(f"{'input':<10} {self.size:10,}  {self.size / total / 2**20:.2f} MiB/s\n")
+        if self.tokens:
+            by_type = ", ".join(f"<{type_}> {count:,}" for type_, count in self.tokens.most_common())
+            file.write(f"{'tokens':<10} {sum(self.tokens.values()):10,}  ({by_type})\n")
+        if self.nodes:
+            file.write(f"{'nodes':<10} {self.nodes:10,}  max depth {self.max_depth:,}\n")
+        file.write(f"{'errors':<10} {self.errors:10,}\n")
+
+
+# Stand-in for Stats.stage when nothing is measured
+def no_stage(name):
+    return contextlib.nullcontext()
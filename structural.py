@@ -0,0 +1,126 @@
+import re
+import sys
+
+from scanner import map_file, number_value, scan_buffer
+from tokens import SpanToken, Token, format_token
+
+try:
+    import numpy
+except ImportError:  # optional, scan_structural falls back to scanner.scan_buffer
+    numpy = None
+
+# Bytes classified at once, in one pass over the input with NumPy
+BLOCK_SIZE = 1 << 20
+
+# Classes of bytes: the ASCII whitespace of scanner.BYTES_LEXEME, punctuation, quotes, and the bytes of
+# numbers, literals and anything else (backslashes and non-ASCII characters included)
+WHITESPACE, PUNCT, QUOTE, OTHER = 0, 1, 2, 3
+CLASSES = bytearray([OTHER]) * 256
+for byte in b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f ":
+    CLASSES[byte] = WHITESPACE
+for byte in b"[]{}:,":
+    CLASSES[byte] = PUNCT
+CLASSES[ord('"')] = QUOTE
+
+# A run of OTHER bytes, and the runs that are one whole token
+RUN = re.compile(rb'[^\t\n\x0b\x0c\r\x1c-\x1f \[\]{}:,"]+')
+NUMBER = re.compile(rb'[0-9.eE+\-]+')
+LITERALS = {b"true": ("BOOL", "true"), b"false": ("BOOL", "false"), b"null": ("NULL", None)}
+PUNCT_TOKENS = {ord(char): char for char in "[]{}:,"}
+
+
+# Scanning a UTF-8 buffer (bytes, bytearray or mmap) with a structural pre-pass, simdjson-style: NumPy finds
+# the quotes that open and close strings and the bytes outside strings that start a token, a block at a time,
+# and tokens are made straight from those offsets without stepping over whitespace or string contents.
+# Same tokens and errors as scan_buffer, which takes over for anything unusual: runs outside strings that
+# are not a whole number or literal, a backslash before a quote outside a string (after which the quotes
+# pair up differently than assumed), and a string that is never closed. Without NumPy it is scan_buffer.
+# With numbers, NUM tokens carry an int or float as they do from scan_buffer.
+def scan_structural(buffer, spans=True, intern=None, numbers=False):
+    if numpy is None:
+        yield from scan_buffer(buffer, spans, intern=intern, numbers=numbers)
+        return
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8) if len(buffer) else numpy.zeros(0, numpy.uint8)
+    classes = numpy.frombuffer(CLASSES, dtype=numpy.uint8)
+    opened = None  # offset of the quote of the string open at the end of the last block
+    parity = 0  # 1 while inside a string at the end of the last block
+    for block in range(0, len(data), BLOCK_SIZE):
+        # Offsets of the tokens' first bytes (and of closing quotes) in this block, up to the offset from
+        # which scan_buffer takes over if there is one
+        starts, tail, parity = structure(data, classes, block, parity)
+        for pos in starts:
+            kind = buffer[pos]
+            if kind == 34:  # '"'
+                if opened is None:
+                    opened = pos
+                    continue
+                if spans:
+                    yield SpanToken("STR", buffer, opened, pos + 1)
+                else:
+                    value = buffer[opened:pos + 1].decode("utf-8")
+                    yield Token("STR", intern.intern(value) if intern is not None else value, opened)
+                opened = None
+            elif kind in PUNCT_TOKENS:
+                yield Token(PUNCT_TOKENS[kind], None, pos)
+            else:
+                end = RUN.match(buffer, pos).end()
+                if end >= tail:  # the run before a stray quote
+                    yield from scan_buffer(buffer, spans, pos, intern=intern, numbers=numbers)
+                    return
+                run = buffer[pos:end]
+                if run in LITERALS:
+                    yield Token(*LITERALS[run], pos)
+                elif NUMBER.fullmatch(run):
+                    value = number_value(run.decode("utf-8")) if numbers else None
+                    if value is not None:
+                        yield Token("NUM", value, pos)
+                    elif spans:
+                        yield SpanToken("NUM", buffer, pos, end)
+                    else:
+                        value = run.decode("utf-8")
+                        yield Token("NUM", intern.intern(value) if intern is not None else value, pos)
+                else:  # errors and non-ASCII characters
+                    yield from scan_buffer(buffer, spans, pos, lambda step: step >= end, intern, numbers)
+        if tail < len(data):
+            yield from scan_buffer(buffer, spans, tail, intern=intern, numbers=numbers)
+            return
+    if opened is not None:  # reported by scan_buffer as a string that was not closed
+        yield from scan_buffer(buffer, spans, opened, intern=intern, numbers=numbers)
+
+
+# Token offsets of the block of data at `block` (a sorted list), the offset of an escaped quote outside a string
+# in it (the length of data if there is none), and whether the block ends inside a string.
+# A quote right after a backslash is taken to be inside a string, as the scanner's STR group takes it.
+def structure(data, classes, block, parity):
+    first = max(block - 1, 0)  # the byte before the block, for the bytes that depend on the one before them
+    chunk = data[first:block + BLOCK_SIZE]
+    kinds = classes[chunk]
+    quotes = kinds == QUOTE
+    escaped = numpy.zeros(len(chunk), dtype=bool)
+    escaped[1:] = quotes[1:] & (chunk[:-1] == 92)  # '\\'
+    real = quotes & ~escaped
+    if block:  # the byte before the block only counts through `parity`
+        real[0] = False
+    inside = numpy.bitwise_xor.accumulate(real.view(numpy.uint8)) ^ parity
+    outside = inside == 0
+    other = (kinds == OTHER) & outside
+    run_starts = other.copy()
+    run_starts[1:] &= ~other[:-1]
+    # Quotes are kept whether they open or close a string (an opening quote is inside, a closing one is not)
+    starts = real | (kinds == PUNCT) & outside | run_starts
+    stray = escaped & outside
+    if block:
+        starts[0] = stray[0] = False
+    starts = numpy.flatnonzero(starts)
+    tail = len(data)
+    stray = numpy.flatnonzero(stray)
+    if len(stray):
+        tail = int(stray[0]) + first
+        starts = starts[:numpy.searchsorted(starts, stray[0])]
+    return (starts + first).tolist(), tail, int(inside[-1])
+
+
+# Tokens of a file scanned with the structural pre-pass: python structural.py FILE
+if __name__ == "__main__":
+    for token in scan_structural(map_file(sys.argv[1])):
+        print(format_token(token))
@@ -1,14 +1,13 @@
-# Token representation
-class Token:
-    def __init__(self, type, value=None):
-        self.type = type
-        self.value = value
+import sys
 
-    def __repr__(self):
-        return f"<{self.type}{', ' + str(self.value) if self.value else ''}>"
+from iterative import DEFAULT_MAX_DEPTH, run
+from tokens import InternTable, Token, TokenStream, read_tokens, where
+from tree_output import write_tree
 
 # Node of the parse tree
 class Node:
+    __slots__ = ("type", "value", "children")
+
     def __init__(self, type_, value=None):
         self.type = type_
         self.value = value
@@ -17,98 +16,151 @@ class Node:
     def add_child(self, child):  # Creating children of the tree
         self.children.append(child)
 
-    def print_tree(self, indent=0):
-        print(" " * indent + f"{self.type} {self.value if self.value else ''}")  # The root (base case)
-        for child in self.children:  # For all the children that is under the root
-            child.print_output(indent + 4)  # Print their tree (glue case)
+    # Every node in pre-order, children indented under their parent; form="jsonl" writes JSON lines
+    def print_tree(self, indent=0, file=None, form="text"):
+        write_tree(self, file or sys.stdout, "syntax", form=form, indent=indent)
 
 
+# Parsing routines are generators: they yield the routine for a nested value and get its node back,
+# so deep nesting uses the explicit stack in iterative.run instead of recursion.
+# With intern=True leaves of the same type and value are one shared Node.
+# Error messages end with where the token is: its line and column given a tokens.LineIndex as lines, else its offset.
 class Parser:
-    def __init__(self, tokens):
-        self.tokens = tokens
+    def __init__(self, tokens, max_depth=DEFAULT_MAX_DEPTH, tree=None, intern=False, lines=None):
+        self.tokens = TokenStream(tokens)  # any iterable of tokens, pulled on demand
+        self.lines = lines  # tokens.LineIndex of the document, for the line and column in error messages
         self.current_token = None
         self.position = -1
         self.advance()
+        self.depth = 0
+        self.max_depth = max_depth
+        if intern:
+            self.leaves = InternTable()
+            self.leaf = self.shared_leaf
+        if tree is not None:  # building into another tree representation, such as compact.CompactTree
+            self.node = tree.node
+            self.add_child = tree.add_child
+            self.leaf = tree.leaf
+
+    # Nodes are only made and linked through these methods, so the tree representation can be swapped
+    def node(self, type_, value=None):
+        return Node(type_, value)
+
+    # Leaf holding a token's value
+    def leaf(self, type_, token):
+        return Node(type_, token.value)
+
+    def shared_leaf(self, type_, token):
+        value = token.value
+        node = self.leaves.get((type_, value))
+        if node is None:
+            node = Node(type_, value)
+            if type(value) is str:  # not a number's value (1 and 1.0 would share a key)
+                self.leaves.keep((type_, value), node, len(value))
+        return node
+
+    def add_child(self, parent, child):
+        parent.add_child(child)
+
+    # Where the current token is, as it ends an error message
+    def where(self):
+        return where(self.current_token, self.lines)
 
     # Moving to the next token
     def advance(self):
         self.position += 1
-        if self.position < len(self.tokens):
-            self.current_token = self.tokens[self.position]
-        else:
-            self.current_token = None
+        self.current_token = self.tokens.advance()
 
     # Moving to the next token assuming the current token is a specified value
     def eat(self, token_type):
         if self.current_token and self.current_token.type == token_type:
             self.advance()
         else:
-            print(f"ERROR: Expected {token_type}, got {self.current_token}")     # Error recovery
+            print(f"ERROR: Expected {token_type}, got {self.current_token}{self.where()}")     # Error recovery
+            self.advance()
+
+    # Moving past a whole list or dict
+    def skip_nested(self):
+        level = 0
+        while self.current_token:
+            if self.current_token.type in ("[", "{"):
+                level += 1
+            elif self.current_token.type in ("]", "}"):
+                level -= 1
             self.advance()
+            if level == 0:
+                break
 
     def parse(self):
-        return self.value()
+        return run(self.value())
 
     # Parsing values
     def value(self):
-        node = Node("value")
+        node = self.node("value")
         token = self.current_token
         if token.type == "STR":
             self.eat("STR")
-            node.add_child(Node("STRING", token.value))
+            self.add_child(node, self.leaf("STRING", token))
         elif token.type == "NUM":
             self.eat("NUM")
-            node.add_child(Node("NUMBER", token.value))
+            self.add_child(node, self.leaf("NUMBER", token))
         elif token.type == "BOOL":
             self.eat("BOOL")
-            node.add_child(Node("BOOLEAN", token.value))
+            self.add_child(node, self.leaf("BOOLEAN", token))
         elif token.type == "NULL":
             self.eat("NULL")
-            node.add_child(Node("NULL"))
+            self.add_child(node, self.node("NULL"))
+        elif token.type in ("{", "[") and self.depth >= self.max_depth:
+            print(f"ERROR: Nesting deeper than {self.max_depth} levels at {token}{self.where()}")   # Skipping it
+            self.skip_nested()
         elif token.type == "{":
-            node.add_child(self.parse_dict())
+            self.add_child(node, (yield self.parse_dict()))
         elif token.type == "[":
-            node.add_child(self.parse_list())
+            self.add_child(node, (yield self.parse_list()))
         else:
-            print(f"ERROR: Unexpected token {token}")   # Error recovery
+            print(f"ERROR: Unexpected token {token}{self.where()}")   # Error recovery
             self.advance()
-            self.value()
+            yield self.value()
         return node
 
     def parse_list(self):
-        node = Node("list")
+        self.depth += 1
+        node = self.node("list")
         self.eat("[")
-        node.add_child(Node("["))
+        self.add_child(node, self.node("["))
 
         # Content inside list
         if self.current_token and self.current_token.type != "]":
-            node.add_child(self.value())
+            self.add_child(node, (yield self.value()))
             while self.current_token and self.current_token.type == ",":
                 self.eat(",")
-                node.add_child(Node(","))
-                node.add_child(self.value())
+                self.add_child(node, self.node(","))
+                self.add_child(node, (yield self.value()))
                 # Add error recovery for trailing comma and no closing bracket
 
         self.eat("]")
-        node.add_child(Node("]"))
+        self.add_child(node, self.node("]"))
+        self.depth -= 1
         return node
 
     def parse_dict(self):
-        node = Node("dict")
+        self.depth += 1
+        node = self.node("dict")
         self.eat("{")
-        node.add_child(Node("{"))
+        self.add_child(node, self.node("{"))
 
         # Content inside dict
         if self.current_token and self.current_token.type != "}":
-            node.add_child(self.parse_pair())
+            self.add_child(node, (yield self.parse_pair()))
             while self.current_token and self.current_token.type == ",":
                 self.eat(",")
-                node.add_child(Node(","))
-                node.add_child(self.parse_pair())
+                self.add_child(node, self.node(","))
+                self.add_child(node, (yield self.parse_pair()))
                 # Add error recovery for trailing comma and no closing bracket
 
         self.eat("}")
-        node.add_child(Node("}"))
+        self.add_child(node, self.node("}"))
+        self.depth -= 1
         return node
 
     def parse_pair(self):
@@ -116,37 +168,20 @@ class Parser:
         key_token = self.current_token
         if key_token.type != "STR":
             # Error recovery
-            print(f"ERROR: Pair key is {key_token.type}, not STRING")
+            print(f"ERROR: Pair key is {key_token.type}, not STRING{self.where()}")
             transformed_value = str(key_token.value)
             key_token = Token("STR", transformed_value)
         self.advance()
         self.eat(":")
-        node = Node("pair")
-        node.add_child(Node("STRING", key_token.value))
-        node.add_child(Node(":"))
-        node.add_child(self.value())
+        node = self.node("pair")
+        self.add_child(node, self.leaf("STRING", key_token))
+        self.add_child(node, self.node(":"))
+        self.add_child(node, (yield self.value()))
         return node
 
 # Recognize tokens from file
 def tokenize(file_path):
-    tokens = []
-    # Removing brackets to get token content
-    matches = {
-        "<STR,": "STR", "<NUM,": "NUM", "<BOOL,": "BOOL", "<NULL>": "NULL", "<[>": "[", "<]>": "]", "<{>": "{",
-        "<}>": "}", "<,>": ",", "<:>": ":"
-    }
-    with open(file_path, "r") as file:
-        for line in file:
-            line = line.strip()
-            if line.startswith("<STR,") or line.startswith("<NUM,") or line.startswith("<BOOL,"):     # when there is an attached value
-                extract = line[1:-1].split(", ")
-                type = extract[0]
-                value = extract[1]
-                tokens.append(Token(matches[f"<{type},"], value))
-            elif line in matches:
-                tokens.append(Token(matches[line]))  # Adding token to list
-
-    return tokens
+    return read_tokens(file_path)
 
 
 if __name__ == "__main__":
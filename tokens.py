@@ -0,0 +1,188 @@
+import mmap
+import re
+from array import array
+from bisect import bisect_right
+from collections import deque
+
+NEWLINE = re.compile("\n")
+BYTES_NEWLINE = re.compile(b"\n")
+
+# Token types as small ints, for the forms of a token stream kept in arrays or files
+TYPES = ["STR", "NUM", "BOOL", "NULL", "[", "]", "{", "}", ":", ","]
+TYPE_CODE = {type_: code for code, type_ in enumerate(TYPES)}
+
+
+# Token representation shared by the scanner and both parsers.
+# Punctuation and NULL tokens use their symbol as the type and have no value.
+# start is the offset of the lexeme in the document (characters of a str, bytes of a buffer), None when
+# the token does not come from a scanner (token files, binary token files).
+class Token:
+    __slots__ = ("type", "value", "start")
+
+    def __init__(self, type, value=None, start=None):
+        self.type = type
+        self.value = value
+        self.start = start
+
+    def __repr__(self):
+        return f"<{self.type}{', ' + str(self.value) if self.value else ''}>"
+
+
+# Token that only remembers where its lexeme is in the source (a str, bytes or mmap).
+# The value is sliced out each time it is asked for, so unread values cost nothing.
+# The length is stored rather than the end: lengths are small ints, which Python does not allocate.
+class SpanToken:
+    __slots__ = ("type", "source", "start", "length")
+
+    def __init__(self, type, source, start, end):
+        self.type = type
+        self.source = source
+        self.start = start
+        self.length = end - start
+
+    @property
+    def end(self):
+        return self.start + self.length
+
+    @property
+    def value(self):
+        value = self.source[self.start:self.start + self.length]
+        return value if isinstance(value, str) else value.decode("utf-8")
+
+    __repr__ = Token.__repr__
+
+
+# Bounded table that hands out one shared copy of each value, so lexemes that repeat (keys such as "id",
+# small values) and the leaves made from them are stored once. Once full it keeps what it has and stops taking more.
+class InternTable(dict):
+    def __init__(self, max_size=1 << 16, max_length=64):
+        super().__init__()
+        self.max_size = max_size
+        self.max_length = max_length  # longer strings rarely repeat
+
+    # The shared copy of a string
+    def intern(self, text):
+        shared = self.get(text)
+        if shared is None:
+            self.keep(text, text, len(text))
+            return text
+        return shared
+
+    # Sharing an object made for a key (from a string of that length), if there is still room
+    def keep(self, key, shared, length):
+        if len(self) < self.max_size and length <= self.max_length:
+            self[key] = shared
+
+
+# Offsets at which the lines of a document start, found in one pass the first time a position is asked for,
+# so turning an offset into a line and column is a binary search. Offsets are characters of a str and bytes
+# of a bytes or mmap source; columns count characters either way. Without a source the lines are added
+# with add() as the text arrives, a str chunk at a time.
+class LineIndex:
+    def __init__(self, source=None):
+        self.source = source
+        self.starts = None if source is not None else array("q", [0])
+
+    def add(self, text, base):
+        self.starts.extend(match.end() + base for match in NEWLINE.finditer(text))
+
+    # Line and column (both from 1) of an offset
+    def line_column(self, offset):
+        starts = self.starts
+        if starts is None:
+            newline = NEWLINE if isinstance(self.source, str) else BYTES_NEWLINE
+            starts = self.starts = array("q", [0])
+            starts.extend(match.end() for match in newline.finditer(self.source))
+        line = bisect_right(starts, offset)
+        line_start = starts[line - 1]
+        if self.source is None or isinstance(self.source, str):
+            return line, 1 + offset - line_start
+        return line, 1 + len(self.source[line_start:offset].decode("utf-8", "replace"))
+
+    # Position of an offset as it ends a message: " (line 3, column 7)"
+    def where(self, offset):
+        line, column = self.line_column(offset)
+        return f" (line {line}, column {column})"
+
+
+# Line index of a document, for the line and column of error messages, when it is in memory (the newlines
+# are found the first time one is asked for). Streams get none, so their memory stays bounded: their
+# parse errors give offsets, and their scanner errors the line and column of the scanner's window.
+def line_index(source):
+    return LineIndex(source) if isinstance(source, (str, bytes, bytearray, mmap.mmap)) else None
+
+
+# Where a token is, as it ends a message: its line and column with a LineIndex of its document, else its
+# offset, and nothing for a token that does not know where it is (or no token)
+def where(token, lines=None):
+    start = getattr(token, "start", None)
+    if start is None:
+        return ""
+    return lines.where(start) if lines is not None else f" (offset {start})"
+
+
+# Line and column (both from 1) of an offset into a str, bytes or mmap source, for one lookup
+# (LineIndex for many)
+def line_column(source, offset):
+    newline = "\n" if isinstance(source, str) else b"\n"
+    line = 1
+    line_start = 0
+    pos = source.find(newline, 0, offset)
+    while pos >= 0:
+        line += 1
+        line_start = pos + 1
+        pos = source.find(newline, line_start, offset)
+    prefix = source[line_start:offset]
+    return line, 1 + len(prefix if isinstance(prefix, str) else prefix.decode("utf-8", "replace"))
+
+
+# Lazy token source for the parsers, pulls tokens from any iterable only when needed
+class TokenStream:
+    def __init__(self, tokens):
+        self.source = iter(tokens)
+        self.window = deque()  # current token followed by the lookahead already pulled
+        self.previous = None
+        self.position = -1
+
+    # Move to the next token and return it
+    def advance(self):
+        if self.window:
+            self.previous = self.window.popleft()
+        self.position += 1
+        return self.peek(0)
+
+    # Look ahead of the current token without moving
+    def peek(self, offset=1):
+        window = self.window
+        while len(window) <= offset:
+            token = next(self.source, None)
+            if token is None:
+                return None
+            window.append(token)
+        return window[offset]
+
+
+# Text form of a token, one per line: <STR, "a">, <NUM, 1>, <{>
+def format_token(token):
+    if token.value is None:
+        return f"<{token.type}>"
+    return f"<{token.type}, {token.value}>"
+
+
+# Recognize tokens from a file in the text form
+def read_tokens(file_path):
+    tokens = []
+    # Removing brackets to get token content
+    matches = {
+        "<STR,": "STR", "<NUM,": "NUM", "<BOOL,": "BOOL", "<NULL>": "NULL", "<[>": "[", "<]>": "]", "<{>": "{",
+        "<}>": "}", "<,>": ",", "<:>": ":"
+    }
+    with open(file_path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith("<STR,") or line.startswith("<NUM,") or line.startswith("<BOOL,"):  # when there is an attached value
+                type, value = line[1:-1].split(", ", 1)  # the value itself may contain ", "
+                tokens.append(Token(matches[f"<{type},"], value))
+            elif line in matches:
+                tokens.append(Token(matches[line]))  # Adding token to list
+    return tokens
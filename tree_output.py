@@ -0,0 +1,157 @@
+import io
+import json
+from array import array
+from json.encoder import encode_basestring
+
+from tokens import format_token
+
+# Characters gathered before they are written to the sink as one block
+BLOCK_SIZE = 1 << 18
+# Characters of indentation prefixes kept for reuse, one prefix per level; deeper lines make their own
+MAX_CACHED_INDENT = 1 << 24
+# Indentation step of each tree's text layout
+STEPS = {"syntax": 4, "semantic": 5}
+
+
+# Lines written to a sink in large blocks: a text file (stdout, open(path, "w"), StringIO), a binary file,
+# or a socket-like object with sendall. flush() writes out what is left.
+class BlockWriter:
+    def __init__(self, sink, block_size=BLOCK_SIZE):
+        if hasattr(sink, "sendall"):
+            self.send = lambda text: sink.sendall(text.encode("utf-8"))
+        elif isinstance(sink, (io.RawIOBase, io.BufferedIOBase)):
+            self.send = lambda text: sink.write(text.encode("utf-8"))
+        else:
+            self.send = sink.write
+        self.parts = []  # reused from block to block
+        self.size = 0
+        self.block_size = block_size
+
+    def add(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.send("".join(self.parts))
+            self.parts.clear()
+            self.size = 0
+
+
+# Spaces in front of the lines of each level, made once per level
+class Prefixes:
+    def __init__(self, indent, step):
+        self.indent = indent
+        self.step = step
+        self.cache = []
+        self.cached = 0  # characters in the cache
+
+    def __getitem__(self, level):
+        cache = self.cache
+        if level < len(cache):
+            return cache[level]
+        prefix = " " * (self.indent + self.step * level)
+        if level == len(cache) and self.cached < MAX_CACHED_INDENT:  # levels are reached one at a time
+            cache.append(prefix)
+            self.cached += len(prefix)
+        return prefix
+
+
+# Writing a parse tree ("syntax") or an AST ("semantic") without recursion, in either form:
+#   text   the layout of print_tree and print_output: one "type value" line per node, indented by
+#          level; unnamed AST nodes only group their children, and an AST with errors prints only them
+#   jsonl  one [depth, type, value] array per node in pre-order, unnamed nodes included, after one
+#          {"code", "message"} object per error
+# Works on the parsers' nodes and on compact tree views alike.
+def write_tree(root, sink, kind, errors=(), form="text", indent=0, block_size=BLOCK_SIZE):
+    writer = BlockWriter(sink, block_size)
+    if form == "jsonl":
+        add_errors(errors, writer, form)
+        write_jsonl(root, writer)
+    elif len(errors):
+        add_errors(errors, writer, form)
+    else:
+        write_text(root, writer, kind, indent)
+    writer.flush()
+
+
+# Tokens one per line, as <TYPE, value> or as [type, value] arrays in the jsonl form
+def write_tokens(tokens, sink, form="text", block_size=BLOCK_SIZE):
+    writer = BlockWriter(sink, block_size)
+    add = writer.add
+    if form == "jsonl":
+        for token in tokens:
+            add(f"[{json_value(token.type)},{json_value(token.value)}]\n")
+    else:
+        for token in tokens:
+            add(format_token(token) + "\n")
+    writer.flush()
+
+
+# Errors one per line, as their message or as {"code", "message"} objects in the jsonl form
+def write_errors(errors, sink, form="text"):
+    writer = BlockWriter(sink)
+    add_errors(errors, writer, form)
+    writer.flush()
+
+
+def add_errors(errors, writer, form):
+    for error in errors:
+        if form == "jsonl":
+            writer.add(json.dumps({"code": error.code, "message": str(error)}) + "\n")
+        else:
+            writer.add(f"{error}\n")
+
+
+# The prefix and the rest of a line go into the block as they are, so deep prefixes are never copied
+# into a line of their own
+def write_text(root, writer, kind, indent=0):
+    prefixes = Prefixes(indent, STEPS[kind])
+    cache = prefixes.cache
+    parts = writer.parts
+    block_size = writer.block_size
+    grouping = kind == "semantic"  # only AST nodes without a name are left out
+    stack = [(root, 0)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node, level = pop()
+        type_ = node.type
+        if not grouping or type_ != "":
+            value = node.value
+            if type(value) is array:  # the values of a "numbers" node, written as in the jsonl form
+                value = json_value(value)
+            prefix = cache[level] if level < len(cache) else prefixes[level]
+            line = f"{type_} {value if value else ''}\n"
+            parts.append(prefix)
+            parts.append(line)
+            writer.size += len(prefix) + len(line)
+            if writer.size >= block_size:
+                writer.flush()
+            level += 1
+        children = node.children
+        for index in range(len(children) - 1, -1, -1):
+            push((children[index], level))
+
+
+def write_jsonl(root, writer):
+    add = writer.add
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        add(f"[{depth},{json_value(node.type)},{json_value(node.value)}]\n")
+        children = node.children
+        for index in range(len(children) - 1, -1, -1):
+            stack.append((children[index], depth + 1))
+
+
+def json_value(value):
+    if value is None:
+        return "null"
+    if type(value) is str:
+        return encode_basestring(value)
+    if type(value) is array:  # the values of a "numbers" node
+        return json.dumps(value.tolist(), separators=(",", ":"))
+    return json.dumps(value)